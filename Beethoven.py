@@ -1,110 +1,79 @@
 import os
 import logging
 import random
-import string
-import sqlite3
-from datetime import datetime
+import signal
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
 from zoneinfo import ZoneInfo
 
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiohttp import web
 from dotenv import load_dotenv
 import asyncio
 
-# --- Загрузка токена из .env ---
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise RuntimeError("В .env отсутствует BOT_TOKEN")
-
-# --- Настройка логирования ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    filename="bot.log",
-    encoding="utf-8",
+from catalog import Locale
+from db import SEARCH_WINDOW, Database
+from export import EXPORT_FORMATS, EXPORT_TABLES, Exporter
+from fsm_storage import SQLiteStorage
+from keys import KeyPool, vless_key
+from logging_setup import bind as log_context, setup_logging
+from maintenance import Maintenance
+from metrics import ApiMetricsMiddleware, MetricsServer
+from middlewares import (
+    CallbackDedupMiddleware,
+    InFlightMiddleware,
+    LastInteractionMiddleware,
+    LocaleMiddleware,
+    LogContextMiddleware,
+    MetricsMiddleware,
+    ThrottlingMiddleware,
 )
+from outbox import Outbox
+from scheduler import Scheduler
+from settings import SettingsStore
+from webhook import WebhookServer
+
 logger = logging.getLogger(__name__)
 
-# --- Инициализация бота и диспетчера с памятью состояний ---
-storage = MemoryStorage()
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(bot=bot, storage=storage)
+# Импорт модуля ничего не открывает и не запускает: база, бот и фоновые
+# компоненты создаются в create_app(), а окружение читается в load_config()
 
 # --- Временная зона ---
 MOSCOW_TZ = ZoneInfo("Europe/Moscow")
 
-# --- Менеджеры (ID) ---
-MANAGERS = {5546292835, 1789838272}
-
-# --- Кодовые слова ---
-CODEWORD_STEP1 = "Симфония"
-CODEWORD_STEP2 = "Людвиг Ван Бетховен"
-
-# --- Поддерживаемые языки ---
-LANGUAGES = {
-    "ru": "Русский",
-    "ua": "Українська",
-    "kz": "Қазақша",
-    "by": "Беларуская",
-    "en": "English",
-    "pl": "Polski"
+# --- Фильтры просмотра обращений: ключ -> (название, статусы) ---
+TICKET_FILTERS = {
+    "all": ("Все", None),
+    "new": ("Новые", ("new",)),
+    "work": ("В работе", ("claimed", "waiting_user")),
+    "closed": ("Закрытые", ("closed",)),
+}
+TICKET_STATUSES = {
+    "new": "Новая",
+    "claimed": "В работе",
+    "waiting_user": "Ждёт ответа пользователя",
+    "closed": "Закрыта",
+}
+OPEN_TICKET_STATUSES = ("new", "claimed", "waiting_user")
+
+TICKETS_PAGE_SIZE = 10
+SEARCH_PAGE_SIZE = 10
+SEARCH_SNIPPET_LENGTH = 300
+MESSAGE_LIMIT = 4096
+EXPORT_MAX_BYTES = 50 * 1024 * 1024  # больше бот отправить не может
+
+# Ограничения частоты по группам обработчиков: (запросов в секунду, запас подряд)
+THROTTLE_LIMITS = {
+    "codewords": (0.2, 3),   # подбор кодовых слов
+    "language": (0.5, 2),
+    "ratings": (0.5, 2),
+    "free_text": (0.2, 3),   # описания проблем, заявки, идеи
 }
-
-# --- Подключение к SQLite ---
-conn = sqlite3.connect("lknvpn_bot.db", check_same_thread=False)
-cursor = conn.cursor()
-
-# --- Создание таблиц ---
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS tickets (
-    code TEXT PRIMARY KEY,
-    user_id INTEGER,
-    problem TEXT,
-    status TEXT,
-    created_at TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS problem_feedback (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    description TEXT UNIQUE,
-    count INTEGER DEFAULT 1
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS ideas (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    idea TEXT,
-    created_at TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS ratings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    rating INTEGER,
-    created_at TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    user_id INTEGER PRIMARY KEY,
-    language TEXT DEFAULT 'ru',
-    last_interaction TEXT
-)
-""")
-
-conn.commit()
 
 # --- Состояния ---
 class Form(StatesGroup):
@@ -119,450 +88,882 @@ class Form(StatesGroup):
     waiting_for_idea = State()
     waiting_for_rating = State()
     waiting_for_manager_problem = State()
+    manager_reply = State()
+    ticket_reply = State()
 
 # --- Вспомогательные функции ---
 
 def now_moscow():
     return datetime.now(MOSCOW_TZ).strftime("%Y-%m-%d %H:%M:%S")
 
-def generate_ticket_code(length=6):
-    chars = string.ascii_uppercase + string.digits
-    while True:
-        code = ''.join(random.choice(chars) for _ in range(length))
-        cursor.execute("SELECT code FROM tickets WHERE code = ?", (code,))
-        if not cursor.fetchone():
-            return code
-
-async def notify_managers(text: str):
-    for manager_id in MANAGERS:
-        try:
-            await bot.send_message(manager_id, text)
-        except Exception as e:
-            logger.error(f"Ошибка при отправке менеджеру {manager_id}: {e}")
-
-async def send_farewell(user_id: int):
-    phrases = [
-        "Спасибо за обращение! Всегда рады помочь.",
-        "Будьте на связи и безопасного интернета!",
-        "Если что — обращайтесь, LKN VPN 24/7.",
-        "Желаем вам отличного дня и стабильного VPN.",
-    ]
-    phrase = random.choice(phrases)
-    try:
-        await bot.send_message(user_id, phrase, reply_markup=main_menu())
-    except Exception as e:
-        logger.error(f"Ошибка при отправке прощального сообщения пользователю {user_id}: {e}")
-
-def user_language(user_id: int):
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    return row[0] if row else "ru"
-
-def save_user_language(user_id: int, lang: str):
-    cursor.execute(
-        "INSERT INTO users (user_id, language, last_interaction) VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET language=?, last_interaction=?",
-        (user_id, lang, now_moscow(), lang, now_moscow())
-    )
-    conn.commit()
-
-# --- Клавиатуры ---
-
-def main_menu():
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        types.InlineKeyboardButton(text="Как подключить VPN", callback_data="how_connect"),
-        types.InlineKeyboardButton(text="Не работает VPN", callback_data="vpn_not_work"),
-    )
-    kb.row(
-        types.InlineKeyboardButton(text="Сбор IP и логов", callback_data="logs"),
-        types.InlineKeyboardButton(text="Подписка (актуально)", callback_data="paid_subscription"),
-    )
-    kb.row(
-        types.InlineKeyboardButton(text="Предложить идею", callback_data="ideas"),
-        types.InlineKeyboardButton(text="Сервер РФ — особенности", callback_data="rf_server"),
-    )
-    kb.row(
-        types.InlineKeyboardButton(text="Админ-панель", callback_data="admin_panel"),
-    )
-    return kb.as_markup()
-
-def device_menu():
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        types.InlineKeyboardButton(text="Android", callback_data="device_Android"),
-        types.InlineKeyboardButton(text="iOS", callback_data="device_iOS"),
-    )
-    kb.row(
-        types.InlineKeyboardButton(text="Windows", callback_data="device_Windows"),
-        types.InlineKeyboardButton(text="MacOS", callback_data="device_MacOS"),
-    )
-    return kb.as_markup()
-
-def server_menu():
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        types.InlineKeyboardButton(text="Россия 🇷🇺", callback_data="server_Russia"),
-        types.InlineKeyboardButton(text="Нидерланды 🇳🇱", callback_data="server_Netherlands"),
-    )
-    return kb.as_markup()
-
-def countries_menu():
-    countries = ["Украина", "Россия", "США", "Великобритания", "Казахстан", "Беларусь", "Другая страна"]
-    kb = InlineKeyboardBuilder()
-    for c in countries:
-        kb.button(text=c, callback_data=f"country_{c}")
-    kb.adjust(2)
-    return kb.as_markup()
-
-def resolve_menu():
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        types.InlineKeyboardButton(text="Решено", callback_data="resolved"),
-        types.InlineKeyboardButton(text="Не решено", callback_data="not_resolved"),
-    )
-    return kb.as_markup()
-
-def rating_keyboard():
-    kb = InlineKeyboardBuilder()
-    for i in range(1, 6):
-        kb.button(text=str(i), callback_data=f"rating_{i}")
-    kb.adjust(5)
-    return kb.as_markup()
-
-def admin_menu():
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        types.InlineKeyboardButton(text="Просмотр обращений", callback_data="admin_tickets"),
-        types.InlineKeyboardButton(text="Статистика", callback_data="admin_stats"),
-    )
-    return kb.as_markup()
-
-def language_menu():
-    kb = InlineKeyboardBuilder()
-    for code, name in LANGUAGES.items():
-        kb.button(text=name, callback_data=f"lang_{code}")
-    kb.adjust(2)
-    return kb.as_markup()
+def split_message(text: str, limit: int = MESSAGE_LIMIT):
+    # Режем по строкам, чтобы не превышать лимит Telegram на длину сообщения
+    chunks, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
 
 # --- Обработчики команд и состояний ---
-
-@dp.message(CommandStart())
-async def cmd_start(message: types.Message, state: FSMContext):
-    await message.answer(
-        "🔐 Добро пожаловать в поддержку LKN VPN!\n\n"
-        "Для начала введите первое кодовое слово.",
-    )
+# Обработчики описаны на шаблоне handlers, который не подключается ни к
+# одному диспетчеру: каждое приложение получает свою копию из build_router().
+# База, бот, настройки и фоновые компоненты приходят в обработчики
+# аргументом app — диспетчер передаёт его сам
+handlers = Router(name="lknvpn")
+
+@handlers.message(CommandStart())
+async def cmd_start(message: types.Message, state: FSMContext, ui: Locale):
+    await message.answer(ui.texts["start"])
     await state.set_state(Form.codeword_wait1)
 
-@dp.message(Form.codeword_wait1)
-async def process_codeword1(message: types.Message, state: FSMContext):
-    if message.text.strip().lower() == CODEWORD_STEP1.lower():
-        await message.answer("Отлично! Теперь введите второе кодовое слово.")
+@handlers.message(Form.codeword_wait1, flags={"throttle": "codewords"})
+async def process_codeword1(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
+    if message.text.strip().lower() == app.settings.current.codewords[0].lower():
+        await message.answer(ui.texts["codeword1_ok"])
         await state.set_state(Form.codeword_wait2)
     else:
-        await message.answer("Неверное кодовое слово. Попробуйте снова.")
+        await message.answer(ui.texts["codeword_wrong"])
 
-@dp.message(Form.codeword_wait2)
-async def process_codeword2(message: types.Message, state: FSMContext):
-    if message.text.strip().lower() == CODEWORD_STEP2.lower():
-        await message.answer("Кодовые слова подтверждены. Выберите язык / Choose language:", reply_markup=language_menu())
+@handlers.message(Form.codeword_wait2, flags={"throttle": "codewords"})
+async def process_codeword2(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
+    if message.text.strip().lower() == app.settings.current.codewords[1].lower():
+        await message.answer(ui.texts["choose_language"], reply_markup=ui.keyboards["language"])
         await state.set_state(Form.language_select)
     else:
-        await message.answer("Неверное кодовое слово. Попробуйте снова.")
+        await message.answer(ui.texts["codeword_wrong"])
 
-@dp.callback_query(Form.language_select, F.data.startswith("lang_"))
-async def process_language(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.language_select, F.data.startswith("lang_"), flags={"throttle": "language"})
+async def process_language(callback: types.CallbackQuery, state: FSMContext, app: "App"):
     lang_code = callback.data.split("_")[1]
-    save_user_language(callback.from_user.id, lang_code)
+    catalog = app.settings.current.catalog
+    if lang_code not in catalog.languages:
+        await callback.answer()
+        return
+    await app.save_user_language(callback.from_user.id, lang_code)
+    ui = catalog.get(lang_code)
     await callback.answer()
-    await callback.message.answer("Язык установлен. Вот главное меню:", reply_markup=main_menu())
+    await callback.message.answer(ui.texts["language_set"], reply_markup=ui.keyboards["main"])
     await state.clear()
 
-@dp.message(Command("help"))
-async def cmd_help(message: types.Message):
-    await message.answer(
-        "Команды:\n"
-        "/start — Запуск бота\n"
-        "/help — Помощь\n"
-        "Используйте кнопки меню для навигации."
-    )
+@handlers.message(Command("help"))
+async def cmd_help(message: types.Message, ui: Locale):
+    await message.answer(ui.texts["help"])
 
 # --- Обработка кнопок главного меню ---
 
-@dp.callback_query(F.data == "how_connect")
-async def cb_how_connect(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(F.data == "how_connect")
+async def cb_how_connect(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
     await callback.answer()
-    await callback.message.answer("Выберите устройство:", reply_markup=device_menu())
+    await callback.message.answer(ui.texts["choose_device"], reply_markup=ui.keyboards["device"])
     await state.set_state(Form.waiting_for_device)
 
-@dp.callback_query(F.data == "vpn_not_work")
-async def cb_vpn_not_work(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(F.data == "vpn_not_work")
+async def cb_vpn_not_work(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
     await callback.answer()
-    await callback.message.answer("Выберите сервер:", reply_markup=server_menu())
+    await callback.message.answer(ui.texts["choose_server"], reply_markup=ui.keyboards["server"])
     await state.set_state(Form.waiting_for_server)
 
-@dp.callback_query(F.data == "logs")
-async def cb_logs(callback: types.CallbackQuery):
+@handlers.callback_query(F.data == "logs")
+async def cb_logs(callback: types.CallbackQuery, ui: Locale):
     await callback.answer()
-    await callback.message.answer(
-        "Мы не собираем личные данные, кроме даты регистрации.\n"
-        "Ваш VPN абсолютно анонимен.",
-        reply_markup=main_menu()
-    )
+    await callback.message.answer(ui.texts["logs"], reply_markup=ui.keyboards["main"])
 
-@dp.callback_query(F.data == "paid_subscription")
-async def cb_paid_subscription(callback: types.CallbackQuery):
+@handlers.callback_query(F.data == "paid_subscription")
+async def cb_paid_subscription(callback: types.CallbackQuery, ui: Locale):
     await callback.answer()
-    await callback.message.answer(
-        "В данный момент VPN бесплатен.\n"
-        "Платная подписка планируется не раньше конца 2025.",
-        reply_markup=main_menu()
-    )
+    await callback.message.answer(ui.texts["paid_subscription"], reply_markup=ui.keyboards["main"])
 
-@dp.callback_query(F.data == "ideas")
-async def cb_ideas(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(F.data == "ideas")
+async def cb_ideas(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
     await callback.answer()
-    await callback.message.answer("Пожалуйста, напишите свои идеи и предложения.")
+    await callback.message.answer(ui.texts["ideas_prompt"])
     await state.set_state(Form.waiting_for_idea)
 
-@dp.callback_query(F.data == "rf_server")
-async def cb_rf_server(callback: types.CallbackQuery):
+@handlers.callback_query(F.data == "rf_server")
+async def cb_rf_server(callback: types.CallbackQuery, ui: Locale):
     await callback.answer()
-    await callback.message.answer(
-        "Серверы РФ работают стабильно и не блокируются РКН.\n"
-        "Вы можете смотреть YouTube и другие сервисы без ограничений.",
-        reply_markup=main_menu()
-    )
+    await callback.message.answer(ui.texts["rf_server"], reply_markup=ui.keyboards["main"])
 
-@dp.callback_query(F.data == "admin_panel")
-async def cb_admin_panel(callback: types.CallbackQuery, state: FSMContext):
-    if callback.from_user.id not in MANAGERS:
-        await callback.answer("Доступ запрещён", show_alert=True)
+@handlers.callback_query(F.data == "admin_panel")
+async def cb_admin_panel(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
         return
     await callback.answer()
-    await callback.message.answer("Админ-панель", reply_markup=admin_menu())
+    await callback.message.answer("Админ-панель", reply_markup=ui.keyboards["admin"])
 
 # --- Обработка выбора устройства ---
 
-@dp.callback_query(Form.waiting_for_device, F.data.startswith("device_"))
-async def cb_device(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.waiting_for_device, F.data.startswith("device_"))
+async def cb_device(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
     device = callback.data.split("_")[1]
     await callback.answer()
-    # В реальном коде нужно вытягивать ключи/инструкции из базы или конфигурации
-    key_text = "vless://examplekey"  # заглушка ключа
-
-    instructions = {
-        "Android": (
-            "Инструкция для Android:\n"
-            "1. Скачайте приложение v2RayTun.\n"
-            "2. Нажмите '+' и выберите 'Ручной ввод'.\n"
-            f"3. Вставьте ключ:\n`{key_text}`\n"
-            "4. Подключитесь и пользуйтесь.\n\n"
-            "Статус VPN: Активно (VLESS)"
-        ),
-        "iOS": (
-            "Инструкция для iOS:\n"
-            "1. Скачайте ShadowRay.\n"
-            f"2. Добавьте конфигурацию с ключом:\n`{key_text}`\n"
-            "3. Подключитесь.\n\n"
-            "Статус VPN: Активно (VLESS)"
-        ),
-        "Windows": (
-            "Инструкция для Windows:\n"
-            "1. Скачайте приложение hiddify.\n"
-            "2. Нажмите '+' → 'Ручной ввод'.\n"
-            f"3. Вставьте ключ:\n`{key_text}`\n"
-            "4. Включите VPN.\n\n"
-            "Статус VPN: Активно (VLESS)"
-        ),
-        "MacOS": (
-            "Инструкция для MacOS:\n"
-            "1. Скачайте ShadowRay или аналог.\n"
-            f"2. Вставьте ключ:\n`{key_text}`\n"
-            "3. Подключитесь.\n\n"
-            "Статус VPN: Активно (VLESS)"
-        ),
-    }
-
-    text = instructions.get(device, "Выберите устройство из списка.")
-    await callback.message.answer(text, parse_mode="Markdown", reply_markup=resolve_menu())
+    # Инструкции собраны заранее в каталоге; персональный ключ вставляется между частями
+    parts = ui.instructions.get(device)
+    key = await app.keys.issue(callback.from_user.id) if parts and app.settings.current.key_template else None
+    if key is not None:
+        text = parts[0] + key + parts[1]
+    else:
+        text = ui.texts.get(f"instruction_{device}", ui.texts["unknown_device"])
+    await callback.message.answer(text, parse_mode="Markdown", reply_markup=ui.keyboards["resolve"])
     await state.set_state(Form.waiting_for_resolve)
 
 # --- Обработка выбора сервера ---
 
-@dp.callback_query(Form.waiting_for_server, F.data.startswith("server_"))
-async def cb_server(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.waiting_for_server, F.data.startswith("server_"))
+async def cb_server(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
     server = callback.data.split("_")[1]
     await state.update_data(chosen_server=server)
     await callback.answer()
-    await callback.message.answer("В какой стране вы находитесь?", reply_markup=countries_menu())
+    await callback.message.answer(ui.texts["choose_country"], reply_markup=ui.keyboards["countries"])
     await state.set_state(Form.waiting_for_country)
 
 # --- Обработка выбора страны ---
 
-@dp.callback_query(Form.waiting_for_country, F.data.startswith("country_"))
-async def cb_country(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.waiting_for_country, F.data.startswith("country_"))
+async def cb_country(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
     country = callback.data.split("_")[1]
     data = await state.get_data()
     server = data.get("chosen_server")
     await callback.answer()
 
-    if server == "Russia" and country == "Украина":
-        await callback.message.answer(
-            "Внимание: Украинские операторы блокируют IP серверов РФ.\n"
-            "Рекомендуем использовать сервер Нидерланды 🇳🇱.",
-            reply_markup=resolve_menu(),
-        )
+    if (server, country) in app.settings.current.blocked_routes:
+        await callback.message.answer(ui.texts["ukraine_warning"], reply_markup=ui.keyboards["resolve"])
     else:
-        await callback.message.answer(
-            "Рекомендации:\n"
-            "• Проверьте интернет\n"
-            "• Перезапустите приложение\n"
-            "• Включите/выключите VPN\n"
-            "• Проверьте настройки\n\n"
-            "Статус VPN: Активно (VLESS)",
-            reply_markup=resolve_menu(),
-        )
+        await callback.message.answer(ui.texts["recommendations"], reply_markup=ui.keyboards["resolve"])
     await state.set_state(Form.waiting_for_resolve)
 
 # --- Решено/Не решено ---
 
-@dp.callback_query(Form.waiting_for_resolve, F.data.in_({"resolved", "not_resolved"}))
-async def cb_resolve(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.waiting_for_resolve, F.data.in_({"resolved", "not_resolved"}))
+async def cb_resolve(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
     await callback.answer()
     if callback.data == "resolved":
-        await callback.message.answer("Рад помочь! Оцените качество от 1 до 5:", reply_markup=rating_keyboard())
+        await callback.message.answer(ui.texts["rate_prompt"], reply_markup=ui.keyboards["rating"])
         await state.set_state(Form.waiting_for_rating)
     else:
-        await callback.message.answer("Опишите проблему подробно, мы свяжемся с вами.")
+        await callback.message.answer(ui.texts["describe_problem"])
         await state.set_state(Form.waiting_for_manager_problem)
 
 # --- Оценка качества ---
 
-@dp.callback_query(Form.waiting_for_rating, F.data.startswith("rating_"))
-async def cb_rating(callback: types.CallbackQuery, state: FSMContext):
+@handlers.callback_query(Form.waiting_for_rating, F.data.startswith("rating_"), flags={"throttle": "ratings"})
+async def cb_rating(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
     rating = int(callback.data.split("_")[1])
     await callback.answer()
-    cursor.execute(
-        "INSERT INTO ratings (user_id, rating, created_at) VALUES (?, ?, ?)",
-        (callback.from_user.id, rating, now_moscow())
-    )
-    conn.commit()
+    app.db.ratings.enqueue(callback.from_user.id, rating, now_moscow())
 
     if rating < 2:
-        await callback.message.answer("Жаль, что не всё понравилось. Пожалуйста, расскажите, что не устроило.")
+        await callback.message.answer(ui.texts["rating_low"])
         await state.set_state(Form.waiting_for_problem_desc)
     else:
-        await send_farewell(callback.from_user.id)
+        await app.send_farewell(callback.from_user.id, ui)
         await state.clear()
 
 # --- Подробности проблемы ---
 
-@dp.message(Form.waiting_for_problem_desc)
-async def msg_problem_desc(message: types.Message, state: FSMContext):
+@handlers.message(Form.waiting_for_problem_desc, flags={"throttle": "free_text"})
+async def msg_problem_desc(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
     desc = message.text.strip()
-    cursor.execute("SELECT id, count FROM problem_feedback WHERE description = ?", (desc,))
-    row = cursor.fetchone()
-    if row:
-        pid, count = row
-        cursor.execute("UPDATE problem_feedback SET count = ? WHERE id = ?", (count + 1, pid))
-    else:
-        cursor.execute("INSERT INTO problem_feedback(description, count) VALUES (?, 1)", (desc,))
-    conn.commit()
-    await message.answer("Спасибо за обратную связь! Мы работаем над улучшением.")
-    await send_farewell(message.from_user.id)
+    app.db.problems.enqueue(desc)
+    await message.answer(ui.texts["feedback_thanks"])
+    await app.send_farewell(message.from_user.id, ui)
     await state.clear()
 
 # --- Проблема менеджеру ---
-@dp.message(Form.waiting_for_manager_problem)
-async def msg_manager_problem(message: types.Message, state: FSMContext):
+@handlers.message(Form.waiting_for_manager_problem, flags={"throttle": "free_text"})
+async def msg_manager_problem(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
     problem = message.text.strip()
-    code = generate_ticket_code()
-    cursor.execute(
-        "INSERT INTO tickets (code, user_id, problem, status, created_at) VALUES (?, ?, ?, ?, ?)",
-        (code, message.from_user.id, problem, "new", now_moscow())
-    )
-    conn.commit()
-    await message.answer(
-        f"Спасибо! Ваша заявка принята.\nКод обращения: {code}\nМенеджер свяжется с вами в ближайшее время.\nПожалуйста, оцените сервис от 1 до 5.",
-        reply_markup=rating_keyboard()
-    )
+    code = await app.db.tickets.create(message.from_user.id, problem, "new", now_moscow())
+    log_context(ticket=code)
+    logger.info(f"Создана заявка #{code}")
+    await message.answer(ui.texts["ticket_accepted"].format(code=code), reply_markup=ui.keyboards["rating"])
     await state.set_state(Form.waiting_for_rating)
 
     # Отправка менеджерам
     text = (f"Новая заявка #{code} от @{message.from_user.username or message.from_user.full_name}:\n"
             f"{problem}\n"
             f"Время: {now_moscow()}")
-    await notify_managers(text)
+    await app.notify_managers(text, reply_markup=ticket_actions_keyboard(code))
+    app.schedule_sla(code, "new")
 
 # --- Идеи ---
-@dp.message(Form.waiting_for_idea)
-async def msg_idea(message: types.Message, state: FSMContext):
+@handlers.message(Form.waiting_for_idea, flags={"throttle": "free_text"})
+async def msg_idea(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
     idea = message.text.strip()
-    cursor.execute(
-        "INSERT INTO ideas (user_id, idea, created_at) VALUES (?, ?, ?)",
-        (message.from_user.id, idea, now_moscow())
-    )
-    conn.commit()
-    await message.answer("Спасибо за вашу идею! Мы обязательно её рассмотрим.", reply_markup=main_menu())
+    app.db.ideas.enqueue(message.from_user.id, idea, now_moscow())
+    await message.answer(ui.texts["idea_thanks"], reply_markup=ui.keyboards["main"])
     await state.clear()
 
 # --- Админ — просмотр заявок ---
-@dp.callback_query(F.data == "admin_tickets")
-async def cb_admin_tickets(callback: types.CallbackQuery):
-    if callback.from_user.id not in MANAGERS:
-        await callback.answer("Доступ запрещён", show_alert=True)
-        return
-    cursor.execute("SELECT code, user_id, problem, status, created_at FROM tickets ORDER BY created_at DESC LIMIT 10")
-    rows = cursor.fetchall()
+
+def encode_ticket_cursor(row):
+    # "2025-01-01 12:00:00" + код -> "20250101120000.K7Q2ZD", чтобы влезть в 64 байта callback_data
+    created_at, code = row[4], row[0]
+    return created_at.replace("-", "").replace(" ", "").replace(":", "") + "." + code
+
+def decode_ticket_cursor(value):
+    stamp, code = value.split(".", 1)
+    created_at = f"{stamp[0:4]}-{stamp[4:6]}-{stamp[6:8]} {stamp[8:10]}:{stamp[10:12]}:{stamp[12:14]}"
+    return created_at, code
+
+def tickets_keyboard(flt, rows, has_newer, has_older):
+    kb = InlineKeyboardBuilder()
+    nav = []
+    if rows and has_newer:
+        nav.append(types.InlineKeyboardButton(text="« Новее", callback_data=f"tk:{flt}:p:{encode_ticket_cursor(rows[0])}"))
+    if rows and has_older:
+        nav.append(types.InlineKeyboardButton(text="Старее »", callback_data=f"tk:{flt}:n:{encode_ticket_cursor(rows[-1])}"))
+    if nav:
+        kb.row(*nav)
+    kb.row(*(
+        types.InlineKeyboardButton(text=("• " if key == flt else "") + title, callback_data=f"tk:{key}:n:")
+        for key, (title, _) in TICKET_FILTERS.items()
+    ))
+    return kb.as_markup()
+
+async def show_tickets(app: "App", message: types.Message, flt: str, cursor=None, backward=False):
+    user_id = None
+    if flt.startswith("u"):
+        user_id, statuses, title = int(flt[1:]), None, f"Обращения пользователя {flt[1:]}"
+    else:
+        title, statuses = TICKET_FILTERS.get(flt, TICKET_FILTERS["all"])
+        title = f"Обращения — {title.lower()}"
+    rows, has_newer, has_older = await app.db.tickets.page(
+        statuses, user_id, cursor, backward, limit=TICKETS_PAGE_SIZE
+    )
     if not rows:
-        await callback.message.answer("Нет заявок для отображения.")
-        await callback.answer()
+        await message.answer("Нет заявок для отображения.", reply_markup=tickets_keyboard(flt, rows, False, False))
         return
 
-    text = "Последние обращения:\n\n"
+    text = f"{title}:\n\n"
     for code, user_id, problem, status, created_at in rows:
         text += (f"Код: {code}\nПользователь: {user_id}\nПроблема: {problem}\n"
-                 f"Статус: {status}\nДата: {created_at}\n\n")
-    await callback.message.answer(text)
+                 f"Статус: {TICKET_STATUSES.get(status, status)}\nДата: {created_at}\n\n")
+    chunks = split_message(text)
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=tickets_keyboard(flt, rows, has_newer, has_older))
+
+@handlers.callback_query(F.data == "admin_tickets")
+async def cb_admin_tickets(callback: types.CallbackQuery, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
+        return
+    await callback.answer()
+    await show_tickets(app, callback.message, "all")
 
-# --- Админ — статистика ---
-@dp.callback_query(F.data == "admin_stats")
-async def cb_admin_stats(callback: types.CallbackQuery):
-    if callback.from_user.id not in MANAGERS:
-        await callback.answer("Доступ запрещён", show_alert=True)
+@handlers.callback_query(F.data.startswith("tk:"))
+async def cb_admin_tickets_page(callback: types.CallbackQuery, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
+        return
+    _, flt, direction, cursor = callback.data.split(":", 3)
+    await callback.answer()
+    await show_tickets(
+        app,
+        callback.message,
+        flt,
+        cursor=decode_ticket_cursor(cursor) if cursor else None,
+        backward=direction == "p",
+    )
+
+@handlers.message(Command("tickets"))
+async def cmd_tickets(message: types.Message, command: CommandObject, ui: Locale, app: "App"):
+    # /tickets — все обращения, /tickets <user_id> — обращения одного пользователя
+    if not app.is_manager(message.from_user.id):
+        await message.answer(ui.texts["access_denied"])
+        return
+    arg = (command.args or "").strip()
+    await show_tickets(app, message, f"u{arg}" if arg.isdigit() else "all")
+
+# --- Админ — поиск по заявкам, идеям и отзывам ---
+
+def format_search_hit(kind, ref, user_id, text, created_at, extra):
+    if len(text or "") > SEARCH_SNIPPET_LENGTH:
+        text = text[:SEARCH_SNIPPET_LENGTH].rstrip() + "…"
+    if kind == "tickets":
+        header = f"Заявка {ref} — {TICKET_STATUSES.get(extra, extra)}, пользователь {user_id}, {created_at}"
+    elif kind == "ideas":
+        header = f"Идея #{ref} — пользователь {user_id}, {created_at}"
+    else:
+        header = f"Проблема #{ref} — отзывов: {extra}"
+    return f"{header}\n{text}\n\n"
+
+async def show_search(app: "App", message: types.Message, query: str, offset: int = 0):
+    rows, has_more, truncated = await app.db.search.find(query, offset=offset, limit=SEARCH_PAGE_SIZE)
+    # Сверх окна совпадения не ранжируются — говорим об этом, а не молча теряем их
+    note = (f"\n\nСовпадений слишком много: учтены последние {SEARCH_WINDOW} заявок, идей и отзывов "
+            f"каждого вида. Уточните запрос." if truncated else "")
+    if not rows:
+        await message.answer(("Ничего не найдено." if not offset else "Больше результатов нет.") + note)
+        return
+    text = f"Поиск «{query}», {offset + 1}–{offset + len(rows)}:\n\n"
+    text += "".join(format_search_hit(*row) for row in rows)
+    text += note.lstrip("\n")
+    kb = InlineKeyboardBuilder()
+    nav = []
+    if offset:
+        nav.append(types.InlineKeyboardButton(text="« Назад", callback_data=f"sr:{max(offset - SEARCH_PAGE_SIZE, 0)}"))
+    if has_more:
+        nav.append(types.InlineKeyboardButton(text="Дальше »", callback_data=f"sr:{offset + SEARCH_PAGE_SIZE}"))
+    if nav:
+        kb.row(*nav)
+    chunks = split_message(text)
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=kb.as_markup() if nav else None)
+
+@handlers.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject, state: FSMContext, ui: Locale, app: "App"):
+    # /search <слова> — поиск по началу слов, результаты от более подходящих
+    if not app.is_manager(message.from_user.id):
+        await message.answer(ui.texts["access_denied"])
+        return
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Использование: /search <слова>, например /search не подключается андроид")
+        return
+    # Запрос не влезает в callback_data, поэтому для листания он хранится в данных состояния
+    await state.update_data(search=query)
+    await show_search(app, message, query)
+
+@handlers.callback_query(F.data.startswith("sr:"))
+async def cb_search_page(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
+        return
+    query = (await state.get_data()).get("search")
+    await callback.answer()
+    if not query:
+        await callback.message.answer("Поиск устарел, повторите /search.")
+        return
+    await show_search(app, callback.message, query, offset=int(callback.data[3:]))
+
+# --- Админ — выгрузка таблиц ---
+
+EXPORT_USAGE = (
+    "Использование: /export <таблица> [с ГГГГ-ММ-ДД] [по ГГГГ-ММ-ДД] [csv|jsonl]\n"
+    f"Таблицы: {', '.join(EXPORT_TABLES)}. Даты — по Москве, обе включительно."
+)
+
+def parse_export_args(args: str):
+    # "tickets 2025-01-01 2025-01-31 jsonl" -> ("tickets", since, until, "jsonl"); None, если не разобрать
+    words = args.split()
+    if not words or words[0] not in EXPORT_TABLES:
+        return None
+    table, fmt, dates = words[0], "csv", []
+    for word in words[1:]:
+        if word in EXPORT_FORMATS:
+            fmt = word
+            continue
+        try:
+            dates.append(datetime.strptime(word, "%Y-%m-%d").replace(tzinfo=MOSCOW_TZ))
+        except ValueError:
+            return None
+    if len(dates) > 2:
+        return None
+    since = int(dates[0].timestamp()) if dates else None
+    until = int((dates[1] + timedelta(days=1)).timestamp()) if len(dates) > 1 else None
+    return table, since, until, fmt
+
+@handlers.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject, ui: Locale, app: "App"):
+    if not app.is_manager(message.from_user.id):
+        await message.answer(ui.texts["access_denied"])
+        return
+    parsed = parse_export_args(command.args or "")
+    if parsed is None:
+        await message.answer(EXPORT_USAGE)
+        return
+    table, since, until, fmt = parsed
+    await message.answer("Готовлю выгрузку, это может занять время…")
+    try:
+        result = await app.exporter.export(table, since, until, fmt)
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки {table}: {e}")
+        await message.answer("Не удалось подготовить выгрузку.")
+        return
+    try:
+        if result.size > EXPORT_MAX_BYTES:
+            await message.answer(
+                f"Файл получился {result.size // (1024 * 1024)} МБ — больше лимита Telegram. Сузьте диапазон дат."
+            )
+            return
+        await message.answer_document(
+            types.FSInputFile(result.path, filename=result.filename),
+            caption=f"{table}: {result.rows} строк",
+        )
+    finally:
+        os.unlink(result.path)
+
+# --- Админ — пересчёт производных таблиц ---
+# /rebuild <цель> пересобирает таблицу из сырых данных, если она разошлась
+# с ними (ручная правка базы, восстановление из копии). Цель — имя
+# репозитория в db с методом rebuild(); пока идёт пересчёт, писатель занят
+REBUILD_TARGETS = ("stats", "search")
+
+@handlers.message(Command("rebuild"))
+async def cmd_rebuild(message: types.Message, command: CommandObject, ui: Locale, app: "App"):
+    if not app.is_manager(message.from_user.id):
+        await message.answer(ui.texts["access_denied"])
+        return
+    target = (command.args or "").strip()
+    if target not in REBUILD_TARGETS:
+        await message.answer(f"Использование: /rebuild <{'|'.join(REBUILD_TARGETS)}> — пересчитать из сырых данных")
         return
+    started = time.monotonic()
+    try:
+        await getattr(app.db, target).rebuild()
+    except Exception as e:
+        logger.error(f"Ошибка пересчёта {target}: {e}")
+        await message.answer(f"Не удалось пересчитать {target}.")
+        return
+    elapsed = time.monotonic() - started
+    logger.info(f"Пересчёт {target} по команде {message.from_user.id}: {elapsed:.1f} с")
+    await message.answer(f"{target}: пересчитано за {elapsed:.1f} с.")
 
-    cursor.execute("SELECT COUNT(*) FROM tickets")
-    total_tickets = cursor.fetchone()[0]
+# --- Жизненный цикл заявок: new → claimed → waiting_user → closed ---
 
-    cursor.execute("SELECT AVG(rating) FROM ratings")
-    avg_rating = cursor.fetchone()[0]
-    avg_rating = round(avg_rating, 2) if avg_rating else "Нет оценок"
+def ticket_actions_keyboard(code: str):
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text="Взять", callback_data=f"tc:claim:{code}"),
+        types.InlineKeyboardButton(text="Ответить", callback_data=f"tc:reply:{code}"),
+        types.InlineKeyboardButton(text="Закрыть", callback_data=f"tc:close:{code}"),
+    )
+    return kb.as_markup()
+
+def user_reply_keyboard(code: str, ui: Locale):
+    kb = InlineKeyboardBuilder()
+    kb.button(text=ui.texts["btn_ticket_reply"], callback_data=f"tu:{code}")
+    return kb.as_markup()
 
-    cursor.execute("SELECT description, count FROM problem_feedback ORDER BY count DESC LIMIT 5")
-    problems = cursor.fetchall()
+def manager_name(user: types.User) -> str:
+    return f"@{user.username}" if user.username else user.full_name
 
+@handlers.callback_query(F.data.startswith("tc:"))
+async def cb_ticket_action(callback: types.CallbackQuery, state: FSMContext, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
+        return
+    _, action, code = callback.data.split(":", 2)
+    log_context(ticket=code)
+    manager_id = callback.from_user.id
+
+    if action == "claim":
+        if await app.db.tickets.transition(code, ("new",), "claimed", manager_id) is None:
+            ticket = await app.db.tickets.get(code)
+            status = TICKET_STATUSES.get(ticket[3], ticket[3]) if ticket else "не найдена"
+            await callback.answer(f"Заявку #{code} уже не взять: {status.lower()}", show_alert=True)
+            return
+        app.schedule_sla(code, "claimed")
+        await callback.answer(f"Заявка #{code} ваша")
+        await app.notify_managers(f"Заявку #{code} взял {manager_name(callback.from_user)}", exclude=(manager_id,))
+
+    elif action == "close":
+        result = await app.db.tickets.transition(code, OPEN_TICKET_STATUSES, "closed", manager_id)
+        if result is None:
+            await callback.answer(f"Заявка #{code} уже закрыта", show_alert=True)
+            return
+        app.schedule_sla(code, "closed")
+        await callback.answer(f"Заявка #{code} закрыта")
+        user_ui = app.settings.current.catalog.get(await app.user_language(result[0]))
+        await app.outbox.send(result[0], user_ui.texts["ticket_closed"].format(code=code))
+        await app.notify_managers(f"Заявку #{code} закрыл {manager_name(callback.from_user)}", exclude=(manager_id,))
+
+    elif action == "reply":
+        await callback.answer()
+        await state.set_state(Form.manager_reply)
+        await state.update_data(ticket=code)
+        await callback.message.answer(f"Напишите ответ пользователю по заявке #{code} одним сообщением.")
+
+    else:
+        await callback.answer()
+
+@handlers.message(Form.manager_reply)
+async def msg_manager_reply(message: types.Message, state: FSMContext, app: "App"):
+    code = (await state.get_data()).get("ticket")
+    await state.clear()
+    if not app.is_manager(message.from_user.id) or not code:
+        return
+    log_context(ticket=code)
+    # Ответ без «Взять» тоже считается взятием заявки
+    result = await app.db.tickets.transition(code, OPEN_TICKET_STATUSES, "waiting_user", message.from_user.id)
+    if result is None:
+        await message.answer(f"Заявка #{code} уже закрыта, ответ не отправлен.")
+        return
+    app.schedule_sla(code, "waiting_user")
+    user_ui = app.settings.current.catalog.get(await app.user_language(result[0]))
+    await app.outbox.send(
+        result[0],
+        user_ui.texts["ticket_reply"].format(code=code, text=message.text),
+        reply_markup=user_reply_keyboard(code, user_ui),
+    )
+    await message.answer(f"Ответ по заявке #{code} отправлен.")
+
+@handlers.callback_query(F.data.startswith("tu:"))
+async def cb_ticket_user_reply(callback: types.CallbackQuery, state: FSMContext, ui: Locale):
+    code = callback.data[3:]
+    await callback.answer()
+    await state.set_state(Form.ticket_reply)
+    await state.update_data(ticket=code)
+    await callback.message.answer(ui.texts["ticket_reply_prompt"].format(code=code))
+
+@handlers.message(Form.ticket_reply, flags={"throttle": "free_text"})
+async def msg_ticket_user_reply(message: types.Message, state: FSMContext, ui: Locale, app: "App"):
+    code = (await state.get_data()).get("ticket")
+    await state.clear()
+    log_context(ticket=code)
+    if await app.db.tickets.transition(code, ("waiting_user",), "claimed", user_id=message.from_user.id) is not None:
+        app.schedule_sla(code, "claimed")
+    else:
+        # Повторный ответ на ту же кнопку: заявка уже ждёт менеджера. Пересылаем,
+        # не сдвигая SLA-таймер, и отказываем, только если заявки нет или она закрыта
+        ticket = await app.db.tickets.get(code)
+        if ticket is None or ticket[1] != message.from_user.id or ticket[3] == "closed":
+            await message.answer(ui.texts["ticket_closed"].format(code=code), reply_markup=ui.keyboards["main"])
+            return
+    await message.answer(ui.texts["ticket_reply_sent"], reply_markup=ui.keyboards["main"])
+    await app.notify_managers(
+        f"Ответ пользователя по заявке #{code}:\n{message.text}",
+        reply_markup=ticket_actions_keyboard(code),
+    )
+
+# --- Админ — статистика ---
+@handlers.callback_query(F.data == "admin_stats")
+async def cb_admin_stats(callback: types.CallbackQuery, ui: Locale, app: "App"):
+    if not app.is_manager(callback.from_user.id):
+        await callback.answer(ui.texts["access_denied"], show_alert=True)
+        return
+
+    stats, problems = await asyncio.gather(app.db.stats.dashboard(datetime.now(MOSCOW_TZ)), app.db.problems.top(5))
+
+    def average(values):
+        return round(values["rating_sum"] / values["ratings"], 2) if values["ratings"] else "Нет оценок"
+
+    total, day, week = stats["total"], stats["last_24h"], stats["last_days"]
     text = (f"📊 Статистика бота:\n"
-            f"Общее количество заявок: {total_tickets}\n"
-            f"Средний рейтинг обслуживания: {avg_rating}\n\n"
-            f"Частые проблемы:\n")
+            f"Общее количество заявок: {total['tickets']}\n"
+            f"Средний рейтинг обслуживания: {average(total)}\n"
+            f"Идей: {total['ideas']}, отзывов о проблемах: {total['feedback']}\n\n"
+            f"За 24 часа: заявок {day['tickets']}, оценок {day['ratings']} (средняя {average(day)})\n"
+            f"За 7 дней: заявок {week['tickets']}, оценок {week['ratings']} (средняя {average(week)})\n")
+    for date, values in stats["days"]:
+        text += f"  {date[5:]}: заявок {values['tickets']}, оценок {values['ratings']}, идей {values['ideas']}\n"
+    text += "\nЧастые проблемы:\n"
 
     if problems:
-        for desc, count in problems:
+        for desc, count, samples in problems:
             text += f"- {desc} ({count} раз)\n"
+            if samples:
+                text += "  также: " + ", ".join(f"«{sample}» ({n})" for sample, n in samples) + "\n"
     else:
         text += "Пока проблем не зарегистрировано."
 
+    if app.db.buffer is not None:
+        buf = app.db.buffer.stats()
+        text += (f"\n\nОчередь записи: {buf['depth']} строк, "
+                 f"сброс {buf['avg_flush_ms']} мс (макс. {buf['max_flush_ms']} мс)")
+
     await callback.message.answer(text)
 
 # --- Обработка неизвестных сообщений ---
-@dp.message()
-async def unknown_message(message: types.Message):
-    await message.answer("Используйте команды /start или кнопки меню для навигации.")
+@handlers.message()
+async def unknown_message(message: types.Message, ui: Locale):
+    await message.answer(ui.texts["unknown"])
+
+# --- Приложение ---
+
+def build_router() -> Router:
+    """Новый Router со всеми обработчиками бота; Router подключается только к одному диспетчеру."""
+    router = Router(name="lknvpn")
+    for name, observer in handlers.observers.items():
+        router.observers[name].handlers.extend(observer.handlers)
+    return router
+
+
+class Config(NamedTuple):
+    """Параметры запуска; из окружения и .env их читает load_config()."""
+
+    bot_token: str
+    db_path: str = "lknvpn_bot.db"
+    ticket_secret: str = "lknvpn"
+    # Менеджеры, кодовые слова, языки, страны, серверы и тексты (см. settings.py)
+    bot_config: str = "bot_config.json"
+    log_file: str = "bot.log"
+    log_json: bool = False
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_rotate_hours: float = 24
+    # METRICS_PORT=0 отключает HTTP-эндпоинт метрик
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9100
+    # Возраст записей для архива в днях, 0 — не архивировать
+    archive_ticket_days: int = 90
+    archive_rating_days: int = 180
+    archive_idea_days: int = 365
+    # SLA: через сколько минут без реакции напоминать всем менеджерам
+    sla_claim_minutes: int = 15
+    sla_reply_minutes: int = 120
+    # Сколько при остановке ждать обработчиков, которые ещё работают
+    drain_timeout: float = 30.0
+
+
+def load_config() -> Config:
+    load_dotenv()
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        raise RuntimeError("В .env отсутствует BOT_TOKEN")
+    defaults = Config._field_defaults
+    return Config(
+        bot_token=token,
+        ticket_secret=os.getenv("TICKET_CODE_SECRET", defaults["ticket_secret"]),
+        bot_config=os.getenv("BOT_CONFIG", defaults["bot_config"]),
+        log_file=os.getenv("LOG_FILE", defaults["log_file"]),
+        log_json=os.getenv("LOG_FORMAT") == "json",
+        log_max_bytes=int(os.getenv("LOG_MAX_BYTES", defaults["log_max_bytes"])),
+        log_rotate_hours=float(os.getenv("LOG_ROTATE_HOURS", defaults["log_rotate_hours"])),
+        metrics_host=os.getenv("METRICS_HOST", defaults["metrics_host"]),
+        metrics_port=int(os.getenv("METRICS_PORT", defaults["metrics_port"])),
+        archive_ticket_days=int(os.getenv("ARCHIVE_TICKET_DAYS", defaults["archive_ticket_days"])),
+        archive_rating_days=int(os.getenv("ARCHIVE_RATING_DAYS", defaults["archive_rating_days"])),
+        archive_idea_days=int(os.getenv("ARCHIVE_IDEA_DAYS", defaults["archive_idea_days"])),
+        sla_claim_minutes=int(os.getenv("SLA_CLAIM_MINUTES", defaults["sla_claim_minutes"])),
+        sla_reply_minutes=int(os.getenv("SLA_REPLY_MINUTES", defaults["sla_reply_minutes"])),
+        drain_timeout=float(os.getenv("SHUTDOWN_DRAIN_SECONDS", defaults["drain_timeout"])),
+    )
+
+
+class App:
+    """
+    Бот целиком: база, бот, диспетчер с обработчиками и фоновые компоненты.
+
+    Конструктор только собирает объекты — к базе и к Telegram он не
+    обращается. startup() (хук диспетчера) один раз применяет миграции
+    схемы, прогревает кэши и запускает фоновые задачи. shutdown() сначала
+    дожидается апдейтов, которые ещё обрабатываются, затем останавливает
+    фоновые задачи, сбрасывает отложенные записи и только потом закрывает
+    базу.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.db = Database(config.db_path, ticket_secret=config.ticket_secret)
+        # Состояния FSM — в SQLite
+        self.storage = SQLiteStorage(self.db)
+        self.bot = Bot(token=config.bot_token)
+        self.dp = Dispatcher(storage=self.storage, app=self)
+        # Снимок настроек перечитывается при изменении файла или по SIGHUP;
+        # обработчики читают app.settings.current
+        self.settings = SettingsStore(config.bot_config)
+        # Фоновая отправка уведомлений с очередью в базе
+        self.outbox = Outbox(self.db, self.bot)
+        # Архивация старых записей и сжатие базы
+        self.maintenance = Maintenance(
+            self.db,
+            ticket_days=config.archive_ticket_days,
+            rating_days=config.archive_rating_days,
+            idea_days=config.archive_idea_days,
+        )
+        # Выгрузка таблиц менеджерам: gzip-файл собирается в отдельном потоке
+        self.exporter = Exporter(self.db)
+        # Персональные ключи VPN из заранее сгенерированного запаса
+        self.keys = KeyPool(self.db, self._generate_vpn_key)
+        # Все SLA-таймеры — на одной куче, а не по задаче на заявку.
+        # new — заявку никто не взял, claimed — взятая заявка без ответа пользователю
+        self.sla_minutes = {"new": config.sla_claim_minutes, "claimed": config.sla_reply_minutes}
+        self.sla = Scheduler(self.on_sla_due)
+        self.metrics_server = (
+            MetricsServer(config.metrics_host, config.metrics_port) if config.metrics_port else None
+        )
+
+        self.in_flight = InFlightMiddleware()
+        self.activity = LastInteractionMiddleware(self.db, now=now_moscow)
+        self.throttling = ThrottlingMiddleware(THROTTLE_LIMITS)
+        self.dp.update.outer_middleware(self.in_flight)
+        self.dp.update.outer_middleware(self.activity)
+        self.dp.update.outer_middleware(LocaleMiddleware(self.db, self.settings))
+        self.dp.callback_query.outer_middleware(CallbackDedupMiddleware())
+        self.dp.message.middleware(MetricsMiddleware())
+        self.dp.callback_query.middleware(MetricsMiddleware())
+        self.dp.message.middleware(LogContextMiddleware())
+        self.dp.callback_query.middleware(LogContextMiddleware())
+        self.bot.session.middleware(ApiMetricsMiddleware())
+        self.dp.message.middleware(self.throttling)
+        self.dp.callback_query.middleware(self.throttling)
+
+        self.dp.include_router(build_router())
+        self.dp.startup.register(self.startup)
+        self.dp.shutdown.register(self.shutdown)
+
+    # --- Запуск и завершение работы ---
+
+    async def startup(self):
+        started = time.monotonic()
+        # Миграции — в потоке: на большой базе первая может идти долго
+        applied = await asyncio.get_running_loop().run_in_executor(None, self.db.migrate)
+        # Оценки, идеи и отзывы пишутся пачками: до 100 строк или раз в 50 мс
+        self.db.start_buffer(max_batch=100, max_delay_ms=50)
+        self.storage.start()
+        self.activity.start()
+        self.outbox.start()
+        self.maintenance.start()
+        self.settings.start()
+        self.keys.start()
+        # Языки недавно активных пользователей — в кэш до первых апдейтов
+        open_tickets, warmed = await asyncio.gather(self.db.tickets.open(self.sla_minutes), self.db.users.warm())
+        for code, status, updated_ts in open_tickets:
+            self.schedule_sla(code, status, since=updated_ts)
+        self.sla.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        logger.info(
+            f"Бот запущен за {time.monotonic() - started:.2f} с: миграции {applied or 'не нужны'}, "
+            f"в кэше {warmed} пользователей, таймеров SLA {len(self.sla)}"
+        )
+
+    async def shutdown(self):
+        # Сначала — апдейты, которые ещё обрабатываются: они пишут в базу и в outbox
+        await self.in_flight.drain(self.config.drain_timeout)
+        await self.settings.close()
+        await self.keys.close()
+        await self.sla.close()
+        await self.maintenance.close()
+        await self.exporter.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        await self.outbox.close()
+        await self.activity.close()
+        # Первым shutdown-хуком Dispatcher.__init__ регистрирует fsm.close, и он
+        # сбрасывает хранилище ещё до drain(); обработчики, которых мы
+        # дождались, могли после этого изменить состояния — сбрасываем снова
+        await self.storage.close()
+        await self.db.aclose()
+
+    # --- Общее для обработчиков ---
+
+    def is_manager(self, user_id: int) -> bool:
+        return user_id in self.settings.current.managers
+
+    async def notify_managers(self, text: str, reply_markup=None, exclude=()):
+        # Только ставим в очередь: отправкой и повторами занимается outbox
+        managers = self.settings.current.managers
+        await self.outbox.send_many([m for m in managers if m not in exclude], text, reply_markup=reply_markup)
+
+    async def send_farewell(self, user_id: int, ui: Locale):
+        phrase = random.choice(ui.farewells)
+        try:
+            await self.bot.send_message(user_id, phrase, reply_markup=ui.keyboards["main"])
+        except Exception as e:
+            logger.error(f"Ошибка при отправке прощального сообщения пользователю {user_id}: {e}")
+
+    async def user_language(self, user_id: int):
+        return await self.db.users.language(user_id) or "ru"
+
+    async def save_user_language(self, user_id: int, lang: str):
+        await self.db.users.save_language(user_id, lang, now_moscow())
+
+    def _generate_vpn_key(self):
+        template = self.settings.current.key_template
+        return vless_key(template) if template else None
+
+    def schedule_sla(self, code: str, status: str, since: float = None):
+        if status in self.sla_minutes:
+            self.sla.schedule(code, (since or time.time()) + self.sla_minutes[status] * 60, status)
+        else:
+            self.sla.cancel(code)
+
+    async def on_sla_due(self, code: str, status: str):
+        # Таймер мог устареть, если статус сменили в другом процессе — сверяемся с базой
+        ticket = await self.db.tickets.get(code)
+        if ticket is None or ticket[3] != status:
+            return
+        waited = int(time.time() - (ticket[5] or time.time())) // 60
+        text = (f"⏰ Заявка #{code} ({TICKET_STATUSES[status].lower()}) без реакции {waited} мин.\n"
+                f"Пользователь: {ticket[1]}\nПроблема: {ticket[2]}")
+        await self.notify_managers(text, reply_markup=ticket_actions_keyboard(code))
+        self.schedule_sla(code, status)
+
+
+def create_app(config: Optional[Config] = None) -> App:
+    """Собрать приложение; без config параметры берутся из окружения."""
+    return App(config or load_config())
 
 # --- Запуск бота ---
-if __name__ == "__main__":
-    import asyncio
+def run_polling(app: App):
+    async def polling():
+        # SIGTERM (systemd, docker stop) останавливает бота так же, как Ctrl+C:
+        # отмена опроса, затем shutdown-хуки
+        task = asyncio.current_task()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+        try:
+            await app.dp.start_polling(app.bot)
+        except asyncio.CancelledError:
+            logger.info("Бот остановлен")
+
+    try:
+        asyncio.run(polling())
+    except KeyboardInterrupt:
+        pass
+
+def run_webhook(app: App):
+    # Вебхук вместо long polling: BOT_MODE=webhook. Без WEBHOOK_URL вебхук в
+    # Telegram не регистрируется — удобно для локальной проверки, когда
+    # апдейты присылаются вручную (см. benchmarks/replay_updates.py)
+    webhook_url = os.getenv("WEBHOOK_URL")
+    secret_token = os.getenv("WEBHOOK_SECRET") or None
+    if webhook_url and not secret_token:
+        raise RuntimeError("WEBHOOK_URL задан без WEBHOOK_SECRET: публичный вебхук без секрета не запускается")
+    server = WebhookServer(
+        app.dp,
+        app.bot,
+        path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        secret_token=secret_token,
+        concurrency=int(os.getenv("WEBHOOK_CONCURRENCY", "64")),
+        max_pending=int(os.getenv("WEBHOOK_MAX_PENDING", "1000")),
+        drain_timeout=app.config.drain_timeout,
+    )
+    web_app = server.build_app()
+    if webhook_url:
+        async def register_webhook(web_app):
+            await server.set_webhook(webhook_url)
+        web_app.on_startup.append(register_webhook)
+    web.run_app(
+        web_app,
+        host=os.getenv("WEBAPP_HOST", "127.0.0.1"),
+        port=int(os.getenv("WEBAPP_PORT", "8080")),
+        print=None,
+    )
+
+def main():
+    config = load_config()
+    # Запись лога на диск в фоновом потоке, с ротацией; LOG_FORMAT=json — по
+    # строке JSON на запись, с полями user_id, handler, ticket
+    setup_logging(
+        filename=config.log_file,
+        json_format=config.log_json,
+        max_bytes=config.log_max_bytes,
+        rotate_interval=config.log_rotate_hours * 3600,
+    )
+    app = create_app(config)
     print("Бот запускается...")
-    asyncio.run(dp.start_polling())
\ No newline at end of file
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        run_webhook(app)
+    else:
+        run_polling(app)
+
+if __name__ == "__main__":
+    main()
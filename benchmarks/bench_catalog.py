@@ -0,0 +1,166 @@
+"""
+Аллокации на апдейт: сборка клавиатур и текстов в обработчике (как было)
+против поиска в заранее собранном catalog.Catalog.
+
+Один «апдейт» — это то, что делают обработчики главного меню, выбора
+устройства и выбора страны: главное меню, меню устройств, инструкция,
+меню стран и меню «Решено/Не решено».
+
+    python benchmarks/bench_catalog.py [--updates 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import types  # noqa: E402
+from aiogram.utils.keyboard import InlineKeyboardBuilder  # noqa: E402
+
+from catalog import Catalog  # noqa: E402
+
+
+# --- Прежние обработчики: всё собирается заново на каждый вызов ---
+
+def legacy_main_menu():
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text="Как подключить VPN", callback_data="how_connect"),
+        types.InlineKeyboardButton(text="Не работает VPN", callback_data="vpn_not_work"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text="Сбор IP и логов", callback_data="logs"),
+        types.InlineKeyboardButton(text="Подписка (актуально)", callback_data="paid_subscription"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text="Предложить идею", callback_data="ideas"),
+        types.InlineKeyboardButton(text="Сервер РФ — особенности", callback_data="rf_server"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text="Админ-панель", callback_data="admin_panel"),
+    )
+    return kb.as_markup()
+
+
+def legacy_device_menu():
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text="Android", callback_data="device_Android"),
+        types.InlineKeyboardButton(text="iOS", callback_data="device_iOS"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text="Windows", callback_data="device_Windows"),
+        types.InlineKeyboardButton(text="MacOS", callback_data="device_MacOS"),
+    )
+    return kb.as_markup()
+
+
+def legacy_countries_menu():
+    countries = ["Украина", "Россия", "США", "Великобритания", "Казахстан", "Беларусь", "Другая страна"]
+    kb = InlineKeyboardBuilder()
+    for c in countries:
+        kb.button(text=c, callback_data=f"country_{c}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+def legacy_resolve_menu():
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text="Решено", callback_data="resolved"),
+        types.InlineKeyboardButton(text="Не решено", callback_data="not_resolved"),
+    )
+    return kb.as_markup()
+
+
+def legacy_instruction(device):
+    key_text = "vless://examplekey"
+    instructions = {
+        "Android": (
+            "Инструкция для Android:\n"
+            "1. Скачайте приложение v2RayTun.\n"
+            "2. Нажмите '+' и выберите 'Ручной ввод'.\n"
+            f"3. Вставьте ключ:\n`{key_text}`\n"
+            "4. Подключитесь и пользуйтесь.\n\n"
+            "Статус VPN: Активно (VLESS)"
+        ),
+        "iOS": (
+            "Инструкция для iOS:\n"
+            "1. Скачайте ShadowRay.\n"
+            f"2. Добавьте конфигурацию с ключом:\n`{key_text}`\n"
+            "3. Подключитесь.\n\n"
+            "Статус VPN: Активно (VLESS)"
+        ),
+        "Windows": (
+            "Инструкция для Windows:\n"
+            "1. Скачайте приложение hiddify.\n"
+            "2. Нажмите '+' → 'Ручной ввод'.\n"
+            f"3. Вставьте ключ:\n`{key_text}`\n"
+            "4. Включите VPN.\n\n"
+            "Статус VPN: Активно (VLESS)"
+        ),
+        "MacOS": (
+            "Инструкция для MacOS:\n"
+            "1. Скачайте ShadowRay или аналог.\n"
+            f"2. Вставьте ключ:\n`{key_text}`\n"
+            "3. Подключитесь.\n\n"
+            "Статус VPN: Активно (VLESS)"
+        ),
+    }
+    return instructions.get(device, "Выберите устройство из списка.")
+
+
+def legacy_update():
+    return (
+        legacy_main_menu(),
+        legacy_device_menu(),
+        legacy_instruction("Android"),
+        legacy_countries_menu(),
+        legacy_resolve_menu(),
+    )
+
+
+def catalog_update(catalog):
+    ui = catalog.get("ru")
+    return (
+        ui.keyboards["main"],
+        ui.keyboards["device"],
+        ui.texts["instruction_Android"],
+        ui.keyboards["countries"],
+        ui.keyboards["resolve"],
+    )
+
+
+def measure(name, fn, updates):
+    fn()  # прогрев: импорты, кэши pydantic
+    tracemalloc.start()
+    peaks = []
+    for _ in range(updates):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(updates):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<8} {elapsed / updates * 1e6:8.1f}µs/апдейт  выделено до {max(peaks):>7} байт/апдейт")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args()
+
+    catalog = Catalog()
+    measure("legacy", legacy_update, args.updates)
+    measure("catalog", lambda: catalog_update(catalog), args.updates)
+
+
+if __name__ == "__main__":
+    main()
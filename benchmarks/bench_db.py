@@ -0,0 +1,103 @@
+"""
+Нагрузочный бенчмарк слоя БД: p50/p99 задержки «обработчика» при 500
+одновременных пользователях.
+
+Сравниваются старый вариант (синхронный sqlite3 прямо в event loop, один
+общий курсор) и db.Database (писатель + пул читателей, WAL).
+
+    python benchmarks/bench_db.py [--users 500] [--rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import SCHEMA, Database  # noqa: E402
+
+NOW = "2025-01-01 12:00:00"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def report(name, latencies, elapsed):
+    print(
+        f"{name:<10} handlers={len(latencies):>6} "
+        f"rps={len(latencies) / elapsed:>8.0f} "
+        f"p50={statistics.median(latencies) * 1000:7.2f}ms "
+        f"p99={percentile(latencies, 0.99) * 1000:7.2f}ms"
+    )
+
+
+async def run_users(handler, users, rounds):
+    # В каждом раунде все пользователи присылают апдейт одновременно;
+    # задержка считается от прихода апдейта до завершения обработчика,
+    # поэтому время ожидания заблокированного event loop тоже учитывается.
+    latencies = []
+
+    async def user(user_id, arrived):
+        await handler(user_id)
+        latencies.append(time.perf_counter() - arrived)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        arrived = time.perf_counter()
+        await asyncio.gather(*(user(i, arrived) for i in range(users)))
+    return latencies, time.perf_counter() - started
+
+
+async def bench_legacy(path, users, rounds):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    cursor = conn.cursor()
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    conn.commit()
+
+    async def handler(user_id):
+        cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
+        cursor.fetchone()
+        cursor.execute(
+            "INSERT INTO ratings (user_id, rating, created_at) VALUES (?, ?, ?)",
+            (user_id, 5, NOW),
+        )
+        conn.commit()
+
+    latencies, elapsed = await run_users(handler, users, rounds)
+    conn.close()
+    return latencies, elapsed
+
+
+async def bench_async(path, users, rounds):
+    db = Database(path)
+    db.migrate()
+
+    async def handler(user_id):
+        await db.users.language(user_id)
+        await db.ratings.add(user_id, 5, NOW)
+
+    latencies, elapsed = await run_users(handler, users, rounds)
+    db.close()
+    return latencies, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report("legacy", *await bench_legacy(os.path.join(tmp, "legacy.db"), args.users, args.rounds))
+        report("async", *await bench_async(os.path.join(tmp, "async.db"), args.users, args.rounds))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
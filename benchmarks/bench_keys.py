@@ -0,0 +1,84 @@
+"""
+Пропускная способность выдачи персональных ключей VPN.
+
+Запас заполняется заранее, затем --users пользователей одновременно (по
+--concurrency) запрашивают ключ; часть запросов повторные и обслуживаются
+из кэша. В конце проверяется, что ни один ключ не выдан дважды и у
+каждого пользователя ровно один ключ.
+
+    python benchmarks/bench_keys.py [--users 20000] [--concurrency 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+from keys import KeyPool, vless_key  # noqa: E402
+
+TEMPLATE = "vless://{uuid}@vpn.example.com:443?encryption=none&security=tls&type=tcp#LKN"
+
+
+def assigned(conn):
+    return conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT key), COUNT(DISTINCT user_id) FROM vpn_keys WHERE user_id IS NOT NULL"
+    ).fetchone()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--repeat", type=float, default=0.3, help="доля повторных запросов")
+    args = parser.parse_args()
+
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench_keys.db"))
+    db.migrate()
+    pool = KeyPool(db, lambda: vless_key(TEMPLATE), low_water=args.users, batch_size=5000)
+
+    started = time.perf_counter()
+    await pool.refill()
+    print(f"Запас из {pool._free} ключей сгенерирован за {time.perf_counter() - started:.2f} с")
+
+    rng = random.Random(1)
+    requests = list(range(args.users))
+    requests += rng.choices(requests, k=int(args.users * args.repeat))
+    rng.shuffle(requests)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    issued = {}
+
+    async def request(user_id):
+        async with semaphore:
+            t = time.perf_counter()
+            key = await pool.issue(user_id)
+            latencies.append(time.perf_counter() - t)
+            if issued.setdefault(user_id, key) != key:
+                raise AssertionError(f"Пользователь {user_id} получил два разных ключа")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request(user_id) for user_id in requests))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Запросов: {len(requests)} за {elapsed:.2f} с — {len(requests) / elapsed:.0f} выдач/с")
+    print(f"Задержка: p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms")
+
+    total, distinct_keys, distinct_users = await db.read(assigned)
+    print(f"Выдано ключей: {total}, уникальных ключей: {distinct_keys}, пользователей: {distinct_users}")
+    ok = total == distinct_keys == distinct_users == args.users == len(set(issued.values()))
+    print("Проверка уникальности:", "OK" if ok else "ОШИБКА")
+    await db.aclose()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
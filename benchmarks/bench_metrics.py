@@ -0,0 +1,125 @@
+"""
+Накладные расходы метрик на апдейт.
+
+Через два одинаковых диспетчера прогоняются одни и те же апдейты: обработчик
+отвечает одним сообщением (сессия бота подменена, сеть не используется) и
+делает два «запроса к базе» — пустые корутины вместо executor, чтобы шум
+потоков не заслонял разницу. Во втором диспетчере включены
+MetricsMiddleware, ApiMetricsMiddleware и такой же замер запросов, как в
+Database.read. Разница времени на апдейт — стоимость метрик.
+
+    python benchmarks/bench_metrics.py [--updates 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+import metrics  # noqa: E402
+from middlewares import MetricsMiddleware  # noqa: E402
+
+BUDGET_US = 50
+
+
+class FakeSession:
+    async def make_request(self, bot, method, timeout=None):
+        return method.__returning__(
+            message_id=1, date=0, chat={"id": method.chat_id, "type": "private"}, text=method.text
+        )
+
+
+def make_update(update_id):
+    return types.Update(
+        update_id=update_id,
+        message={
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "u"},
+            "text": "ping",
+        },
+    )
+
+
+async def fake_query(conn):
+    return None
+
+
+def build(instrumented: bool):
+    bot = Bot(token="42:TEST")
+    bot.session.make_request = FakeSession().make_request
+    dp = Dispatcher()
+
+    if instrumented:
+        bot.session.middleware(metrics.ApiMetricsMiddleware())
+        dp.message.middleware(MetricsMiddleware())
+
+        async def db_call():
+            # То же, что делает Database._timed вокруг запроса
+            started = time.perf_counter()
+            try:
+                return await fake_query(None)
+            finally:
+                metrics.DB_SECONDS.observe(time.perf_counter() - started, "read", "noop")
+    else:
+        async def db_call():
+            return await fake_query(None)
+
+    @dp.message()
+    async def handler(message: types.Message):
+        await db_call()
+        await db_call()
+        await bot(SendMessage(chat_id=message.chat.id, text="pong"))
+
+    return bot, dp
+
+
+async def run(instrumented: bool, updates) -> float:
+    bot, dp = build(instrumented)
+    for update in updates[:500]:  # прогрев
+        await dp.feed_update(bot, update)
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates)
+
+
+def micro(n=200_000):
+    started = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        metrics.HANDLER_SECONDS.observe(time.perf_counter() - t, "handler")
+    return (time.perf_counter() - started) / n
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    updates = [make_update(i) for i in range(args.updates)]
+
+    plain, instrumented = [], []
+    # Чередуем прогоны и берём минимум, чтобы шум не попал в разницу
+    for _ in range(args.rounds):
+        plain.append(await run(False, updates))
+        instrumented.append(await run(True, updates))
+    base, with_metrics = min(plain), min(instrumented)
+    overhead_us = (with_metrics - base) * 1e6
+
+    print(f"Без метрик:  {base * 1e6:.1f} мкс/апдейт")
+    print(f"С метриками: {with_metrics * 1e6:.1f} мкс/апдейт")
+    print(f"Накладные расходы: {overhead_us:.1f} мкс/апдейт (бюджет {BUDGET_US} мкс)")
+    print(f"Одно наблюдение гистограммы с замером: {micro() * 1e6:.2f} мкс")
+    if overhead_us > BUDGET_US:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Скорость поиска /search на большой базе.
+
+Заполняет временную базу --rows заявками, идеями и отзывами из случайных
+русских фраз (индекс FTS5 наполняют те же триггеры, что и в боте), затем
+замеряет задержку db.search.find() для набора типичных запросов.
+
+    python benchmarks/bench_search.py [--rows 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+
+WORDS = (
+    "впн не работает подключение ошибка андроид айфон windows macos сервер нидерланды россия "
+    "медленно скорость таймаут ключ vless приложение v2rayng streisand обновление соединение "
+    "сбрасывается youtube telegram инстаграм оплата подписка спасибо отлично добавьте ещё "
+    "страну быстрее интерфейс настройки инструкция непонятно всё хорошо плохо иногда вечером"
+).split()
+QUERIES = (
+    "не работает", "андро", "ошибка подключения", "vless", "youtube медленно",
+    "нидерланды таймаут", "оплат", "всё хорошо", "streisand ключ", "инстаграм вечером",
+)
+
+
+def phrase(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(4, 20)))
+
+
+def fill(conn, rows, seed):
+    rng = random.Random(seed)
+    conn.executemany(
+        "INSERT INTO tickets (code, user_id, problem, status, created_at) VALUES (?, ?, ?, 'new', '2025-01-01 10:00:00')",
+        ((f"T{i:09d}", rng.randrange(100_000), phrase(rng)) for i in range(rows * 6 // 10)),
+    )
+    conn.executemany(
+        "INSERT INTO ideas (user_id, idea, created_at) VALUES (?, ?, '2025-01-01 10:00:00')",
+        ((rng.randrange(100_000), phrase(rng)) for _ in range(rows * 3 // 10)),
+    )
+    conn.executemany(
+        "INSERT INTO problem_feedback (description, fingerprint) VALUES (?, ?)",
+        ((phrase(rng), str(i)) for i in range(rows // 10)),
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench_search.db"))
+    db.migrate()
+    started = time.perf_counter()
+    await db.write(fill, args.rows, 1)
+    print(f"{args.rows} строк с индексом записаны за {time.perf_counter() - started:.1f} с")
+
+    for query in QUERIES:
+        latencies = []
+        for page in range(args.repeat):
+            t = time.perf_counter()
+            rows, _, _ = await db.search.find(query, offset=(page % 3) * 10)
+            latencies.append(time.perf_counter() - t)
+        print(f"{query!r:24} p50={statistics.median(latencies) * 1000:7.2f}ms "
+              f"max={max(latencies) * 1000:7.2f}ms  найдено на странице: {len(rows)}")
+    await db.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+Стоимость генерации кода обращения при 10M существующих заявок.
+
+Сравниваются старый generate_ticket_code (random.choice + SELECT после
+каждого кандидата) и TicketRepository.create (номер из последовательности,
+перемешанный в 6-символьный код, одна транзакция без чтения).
+
+    python benchmarks/bench_ticket_codes.py [--existing 10000000] [--samples 2000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database, ticket_code  # noqa: E402
+
+NOW = "2025-01-01 12:00:00"
+
+
+def fill(path, existing):
+    db = Database(path)
+    db.migrate()
+    db.close()
+    conn = sqlite3.connect(path)
+    chars = string.ascii_uppercase + string.digits
+    batch = 100_000
+    started = time.perf_counter()
+    for offset in range(0, existing, batch):
+        rows = (
+            ("".join(random.choices(chars, k=6)), i, "problem", "new", NOW)
+            for i in range(offset, min(existing, offset + batch))
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO tickets (code, user_id, problem, status, created_at) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+    total = conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+    conn.close()
+    print(f"Заполнено {total} заявок за {time.perf_counter() - started:.1f} с")
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    print(
+        f"{name:<10} mean={statistics.mean(timings) * 1e6:8.1f}µs "
+        f"p99={timings[int(len(timings) * 0.99)] * 1e6:8.1f}µs"
+    )
+
+
+def bench_legacy(path, samples):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    chars = string.ascii_uppercase + string.digits
+    timings = []
+    for i in range(samples):
+        started = time.perf_counter()
+        while True:
+            code = "".join(random.choice(chars) for _ in range(6))
+            cursor.execute("SELECT code FROM tickets WHERE code = ?", (code,))
+            if not cursor.fetchone():
+                break
+        cursor.execute(
+            "INSERT INTO tickets (code, user_id, problem, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (code, i, "problem", "new", NOW),
+        )
+        conn.commit()
+        timings.append(time.perf_counter() - started)
+    conn.close()
+    return timings
+
+
+async def bench_sequence(path, samples):
+    db = Database(path)
+    timings = []
+    for i in range(samples):
+        started = time.perf_counter()
+        await db.tickets.create(i, "problem", "new", NOW)
+        timings.append(time.perf_counter() - started)
+    await db.aclose()
+    return timings
+
+
+def bench_scramble(samples):
+    key = b"benchmark"
+    timings = []
+    for i in range(samples):
+        started = time.perf_counter()
+        ticket_code(10_000_000 + i, key)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--existing", type=int, default=10_000_000)
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tickets.db")
+        fill(path, args.existing)
+        report("legacy", bench_legacy(path, args.samples))
+        report("sequence", asyncio.run(bench_sequence(path, args.samples)))
+        report("code only", bench_scramble(args.samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Нагрузочный тест без сети: синтетические пользователи проходят сценарии
+бота, апдейты подаются прямо в dp.feed_update, а сессия бота подменена
+заглушкой, которая отвечает на любой запрос к Bot API после задержки,
+изображающей сеть (--api-latency, среднее и разброс в миллисекундах).
+
+Сценарии:
+- подключение: /start → кодовые слова → язык → «Как подключить» →
+  устройство → «Решено» → оценка;
+- не работает: /start → кодовые слова → язык → «Не работает VPN» →
+  сервер → страна → «Не решено» → заявка менеджеру → низкая оценка →
+  описание проблемы.
+
+Бот работает с настоящей базой SQLite во временном каталоге. Печатается
+пропускная способность, p50/p99 по обработчикам, время запросов к базе
+и, с --memory, прирост памяти на пользователя (включает FSM-сессию).
+
+    python benchmarks/load_test.py --users 1000
+    python benchmarks/load_test.py --users 100000 --concurrency 500 --memory
+    python benchmarks/load_test.py --api-latency 0  # только обработка, без сети
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# База бота создаётся в текущем каталоге — уводим её во временный
+os.chdir(tempfile.mkdtemp(prefix="lknvpn_load_"))
+
+from aiogram import types  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+import Beethoven  # noqa: E402
+import metrics  # noqa: E402
+
+app = Beethoven.create_app(Beethoven.Config(bot_token="42:TEST", metrics_port=0))
+
+
+class FakeSession:
+    """Отвечает на запросы к Bot API без сети, с задержкой latency ± jitter секунд, и считает их по методам."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 1):
+        self.calls = Counter()
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(max(0.0, self.rng.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+        if isinstance(method, SendMessage):
+            return method.__returning__(
+                message_id=1, date=0, chat={"id": method.chat_id, "type": "private"}, text=method.text
+            )
+        return True
+
+
+class HandlerTimer:
+    """Внутренний middleware, который запоминает длительность каждого вызова обработчика."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples[data["handler"].callback.__name__].append(time.perf_counter() - started)
+
+
+class User:
+    def __init__(self, user_id: int, ids):
+        self.user_id = user_id
+        self.ids = ids
+        self.sender = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    def message(self, text: str) -> types.Update:
+        update_id = next(self.ids)
+        message = {"message_id": update_id, "date": 0, "chat": self.chat, "from": self.sender, "text": text}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return types.Update(update_id=update_id, message=message)
+
+    def press(self, data: str) -> types.Update:
+        update_id = next(self.ids)
+        return types.Update(
+            update_id=update_id,
+            callback_query={
+                "id": str(update_id),
+                "chat_instance": str(self.user_id),
+                "from": self.sender,
+                "data": data,
+                "message": {"message_id": update_id, "date": 0, "chat": self.chat, "text": "..."},
+            },
+        )
+
+
+def scenario(user: User, rng: random.Random):
+    yield user.message("/start")
+    first, second = app.settings.current.codewords
+    yield user.message(first)
+    yield user.message(second)
+    yield user.press("lang_ru")
+    if rng.random() < 0.7:
+        yield user.press("how_connect")
+        yield user.press(f"device_{rng.choice(app.settings.current.catalog.devices)}")
+        yield user.press("resolved")
+        yield user.press(f"rating_{rng.randint(2, 5)}")
+    else:
+        yield user.press("vpn_not_work")
+        yield user.press(f"server_{rng.choice(app.settings.current.catalog.servers)}")
+        yield user.press(f"country_{rng.choice(app.settings.current.catalog.countries)}")
+        yield user.press("not_resolved")
+        yield user.message(f"Не подключается, ошибка {rng.randint(1, 50)}")
+        yield user.press("rating_1")
+        yield user.message(rng.choice(("Медленно", "Обрывается", "Не открываются сайты")))
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="сколько пользователей одновременно")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="замерить прирост памяти (медленнее)")
+    parser.add_argument("--api-latency", type=float, default=50.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--api-jitter", type=float, default=20.0, help="разброс задержки Bot API, ± мс")
+    args = parser.parse_args()
+
+    session = FakeSession(args.api_latency / 1000, min(args.api_jitter, args.api_latency) / 1000, args.seed)
+    app.bot.session.make_request = session.make_request
+    timer = HandlerTimer()
+    app.dp.message.middleware(timer)
+    app.dp.callback_query.middleware(timer)
+
+    rng = random.Random(args.seed)
+    ids = iter(range(1, 10**9))
+    users = [User(10**6 + i, ids) for i in range(args.users)]
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(user):
+        async with semaphore:
+            for update in scenario(user, rng):
+                started = time.perf_counter()
+                await app.dp.feed_update(app.bot, update)
+                latencies.append(time.perf_counter() - started)
+
+    await app.dp.emit_startup(dispatcher=app.dp, bot=app.bot, bots=(app.bot,))
+    if args.memory:
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(user) for user in users))
+    elapsed = time.perf_counter() - started
+
+    if args.memory:
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    buffer_stats = app.db.buffer.stats()
+    await app.dp.emit_shutdown(dispatcher=app.dp, bot=app.bot, bots=(app.bot,))
+
+    print(f"Пользователей: {args.users}, одновременно: {args.concurrency}, "
+          f"задержка Bot API: {args.api_latency:g} ± {min(args.api_jitter, args.api_latency):g} мс")
+    print(f"Апдейтов: {len(latencies)} за {elapsed:.2f} с — {len(latencies) / elapsed:.0f} апдейтов/с")
+    print(f"Апдейт целиком: p50={percentile(latencies, 0.5) * 1000:.2f}ms p99={percentile(latencies, 0.99) * 1000:.2f}ms")
+    print("\nОбработчики:")
+    for name, samples in sorted(timer.samples.items()):
+        print(f"  {name:<24} n={len(samples):<7} p50={percentile(samples, 0.5) * 1000:7.2f}ms "
+              f"p99={percentile(samples, 0.99) * 1000:7.2f}ms")
+
+    print("\nSQLite (время включает ожидание потока):")
+    for kind in ("read", "write"):
+        count = sum(s[2] for labels, s in metrics.DB_SECONDS._series.items() if labels[0] == kind)
+        total = sum(s[1] for labels, s in metrics.DB_SECONDS._series.items() if labels[0] == kind)
+        if count:
+            print(f"  {kind:<6} запросов={count:<7} среднее={total / count * 1000:.2f}ms")
+    errors = sum(metrics.DB_ERRORS._values.values())
+    print(f"  ошибок (в том числе database is locked): {errors:.0f}")
+    print(f"  буфер записи: {buffer_stats}")
+
+    print(f"\nBot API: {dict(session.calls)}")
+    print(f"Отклонено троттлингом: {app.throttling.rejected}")
+    if args.memory:
+        grown = memory_after - memory_before
+        print(f"Память: +{grown / 1024 / 1024:.1f} МБ, {grown / args.users:.0f} байт на пользователя "
+              f"(FSM-кэш: {len(app.storage._cache)} записей)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+Отправка записанных апдейтов на локальный вебхук.
+
+Каждая строка входного файла — JSON апдейта в том виде, в каком его
+присылает Telegram. Скрипт шлёт их POST-запросами с секретным токеном и
+печатает коды ответов и задержку приёма.
+
+    BOT_MODE=webhook WEBHOOK_SECRET=s python Beethoven.py
+    python benchmarks/replay_updates.py benchmarks/updates_sample.jsonl --secret s
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+import aiohttp
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("updates", help="JSONL с апдейтами")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.updates, encoding="utf-8") as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(args.url, json=update) as response:
+                    statuses[response.status] += 1
+                latencies.append(time.perf_counter() - started)
+
+        update_id = 0
+        tasks = []
+        for _ in range(args.repeat):
+            for update in updates:
+                update_id += 1
+                tasks.append(post({**update, "update_id": update_id}))
+        await asyncio.gather(*tasks)
+
+    latencies.sort()
+    print(f"Ответы: {dict(statuses)}")
+    print(
+        f"Приём: p50={statistics.median(latencies) * 1000:.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,730 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Tuple
+
+from aiogram import types
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+# --- Каталог текстов и клавиатур ---
+# Все тексты и клавиатуры собираются один раз при запуске. Обработчик
+# получает готовый Locale для языка пользователя и только достаёт из него
+# нужное по ключу. Объекты разметки aiogram неизменяемы, поэтому один и тот
+# же экземпляр безопасно отправлять всем пользователям.
+
+DEFAULT_LANGUAGE = "ru"
+
+# --- Поддерживаемые языки ---
+LANGUAGES = {
+    "ru": "Русский",
+    "ua": "Українська",
+    "kz": "Қазақша",
+    "by": "Беларуская",
+    "en": "English",
+    "pl": "Polski"
+}
+
+DEVICES = ("Android", "iOS", "Windows", "MacOS")
+SERVERS = ("Russia", "Netherlands")
+# Названия стран — это ещё и идентификаторы в callback_data, их не переводим
+COUNTRIES = ("Украина", "Россия", "США", "Великобритания", "Казахстан", "Беларусь", "Другая страна")
+
+KEY_PLACEHOLDER = "vless://examplekey"
+_KEY_MARKER = "\x00key\x00"
+
+TEXTS = {
+    "ru": {
+        "start": "🔐 Добро пожаловать в поддержку LKN VPN!\n\nДля начала введите первое кодовое слово.",
+        "codeword1_ok": "Отлично! Теперь введите второе кодовое слово.",
+        "codeword_wrong": "Неверное кодовое слово. Попробуйте снова.",
+        "choose_language": "Кодовые слова подтверждены. Выберите язык / Choose language:",
+        "language_set": "Язык установлен. Вот главное меню:",
+        "help": "Команды:\n/start — Запуск бота\n/help — Помощь\nИспользуйте кнопки меню для навигации.",
+        "choose_device": "Выберите устройство:",
+        "choose_server": "Выберите сервер:",
+        "logs": "Мы не собираем личные данные, кроме даты регистрации.\nВаш VPN абсолютно анонимен.",
+        "paid_subscription": "В данный момент VPN бесплатен.\nПлатная подписка планируется не раньше конца 2025.",
+        "ideas_prompt": "Пожалуйста, напишите свои идеи и предложения.",
+        "rf_server": (
+            "Серверы РФ работают стабильно и не блокируются РКН.\n"
+            "Вы можете смотреть YouTube и другие сервисы без ограничений."
+        ),
+        "access_denied": "Доступ запрещён",
+        "instruction_Android": (
+            "Инструкция для Android:\n"
+            "1. Скачайте приложение v2RayTun.\n"
+            "2. Нажмите '+' и выберите 'Ручной ввод'.\n"
+            "3. Вставьте ключ:\n`{key}`\n"
+            "4. Подключитесь и пользуйтесь."
+        ),
+        "instruction_iOS": (
+            "Инструкция для iOS:\n"
+            "1. Скачайте ShadowRay.\n"
+            "2. Добавьте конфигурацию с ключом:\n`{key}`\n"
+            "3. Подключитесь."
+        ),
+        "instruction_Windows": (
+            "Инструкция для Windows:\n"
+            "1. Скачайте приложение hiddify.\n"
+            "2. Нажмите '+' → 'Ручной ввод'.\n"
+            "3. Вставьте ключ:\n`{key}`\n"
+            "4. Включите VPN."
+        ),
+        "instruction_MacOS": (
+            "Инструкция для MacOS:\n"
+            "1. Скачайте ShadowRay или аналог.\n"
+            "2. Вставьте ключ:\n`{key}`\n"
+            "3. Подключитесь."
+        ),
+        "vpn_status": "Статус VPN: Активно (VLESS)",
+        "unknown_device": "Выберите устройство из списка.",
+        "choose_country": "В какой стране вы находитесь?",
+        "ukraine_warning": (
+            "Внимание: Украинские операторы блокируют IP серверов РФ.\n"
+            "Рекомендуем использовать сервер Нидерланды 🇳🇱."
+        ),
+        "recommendations": (
+            "Рекомендации:\n"
+            "• Проверьте интернет\n"
+            "• Перезапустите приложение\n"
+            "• Включите/выключите VPN\n"
+            "• Проверьте настройки"
+        ),
+        "rate_prompt": "Рад помочь! Оцените качество от 1 до 5:",
+        "describe_problem": "Опишите проблему подробно, мы свяжемся с вами.",
+        "rating_low": "Жаль, что не всё понравилось. Пожалуйста, расскажите, что не устроило.",
+        "feedback_thanks": "Спасибо за обратную связь! Мы работаем над улучшением.",
+        "ticket_accepted": (
+            "Спасибо! Ваша заявка принята.\nКод обращения: {code}\n"
+            "Менеджер свяжется с вами в ближайшее время.\nПожалуйста, оцените сервис от 1 до 5."
+        ),
+        "idea_thanks": "Спасибо за вашу идею! Мы обязательно её рассмотрим.",
+        "ticket_reply": "Ответ менеджера по заявке {code}:\n{text}",
+        "ticket_closed": "Заявка {code} закрыта. Если проблема осталась, создайте новое обращение через /start.",
+        "ticket_reply_prompt": "Напишите ответ по заявке {code} одним сообщением.",
+        "ticket_reply_sent": "Ответ передан менеджеру.",
+        "throttled": "Слишком часто, подождите немного и попробуйте снова.",
+        "btn_ticket_reply": "Ответить",
+        "unknown": "Используйте команды /start или кнопки меню для навигации.",
+        "farewells": (
+            "Спасибо за обращение! Всегда рады помочь.",
+            "Будьте на связи и безопасного интернета!",
+            "Если что — обращайтесь, LKN VPN 24/7.",
+            "Желаем вам отличного дня и стабильного VPN.",
+        ),
+        "btn_how_connect": "Как подключить VPN",
+        "btn_vpn_not_work": "Не работает VPN",
+        "btn_logs": "Сбор IP и логов",
+        "btn_subscription": "Подписка (актуально)",
+        "btn_ideas": "Предложить идею",
+        "btn_rf_server": "Сервер РФ — особенности",
+        "btn_admin": "Админ-панель",
+        "btn_resolved": "Решено",
+        "btn_not_resolved": "Не решено",
+        "server_Russia": "Россия 🇷🇺",
+        "server_Netherlands": "Нидерланды 🇳🇱",
+        "countries": ("Украина", "Россия", "США", "Великобритания", "Казахстан", "Беларусь", "Другая страна"),
+    },
+    "ua": {
+        "start": "🔐 Ласкаво просимо до підтримки LKN VPN!\n\nДля початку введіть перше кодове слово.",
+        "codeword1_ok": "Чудово! Тепер введіть друге кодове слово.",
+        "codeword_wrong": "Невірне кодове слово. Спробуйте ще раз.",
+        "choose_language": "Кодові слова підтверджено. Оберіть мову / Choose language:",
+        "language_set": "Мову встановлено. Ось головне меню:",
+        "help": "Команди:\n/start — Запуск бота\n/help — Допомога\nВикористовуйте кнопки меню для навігації.",
+        "choose_device": "Оберіть пристрій:",
+        "choose_server": "Оберіть сервер:",
+        "logs": "Ми не збираємо особисті дані, окрім дати реєстрації.\nВаш VPN абсолютно анонімний.",
+        "paid_subscription": "Наразі VPN безкоштовний.\nПлатна підписка планується не раніше кінця 2025.",
+        "ideas_prompt": "Будь ласка, напишіть свої ідеї та пропозиції.",
+        "rf_server": (
+            "Сервери РФ працюють стабільно і не блокуються РКН.\n"
+            "Ви можете дивитися YouTube та інші сервіси без обмежень."
+        ),
+        "access_denied": "Доступ заборонено",
+        "instruction_Android": (
+            "Інструкція для Android:\n"
+            "1. Завантажте застосунок v2RayTun.\n"
+            "2. Натисніть '+' і оберіть 'Ручне введення'.\n"
+            "3. Вставте ключ:\n`{key}`\n"
+            "4. Підключіться та користуйтеся."
+        ),
+        "instruction_iOS": (
+            "Інструкція для iOS:\n"
+            "1. Завантажте ShadowRay.\n"
+            "2. Додайте конфігурацію з ключем:\n`{key}`\n"
+            "3. Підключіться."
+        ),
+        "instruction_Windows": (
+            "Інструкція для Windows:\n"
+            "1. Завантажте застосунок hiddify.\n"
+            "2. Натисніть '+' → 'Ручне введення'.\n"
+            "3. Вставте ключ:\n`{key}`\n"
+            "4. Увімкніть VPN."
+        ),
+        "instruction_MacOS": (
+            "Інструкція для MacOS:\n"
+            "1. Завантажте ShadowRay або аналог.\n"
+            "2. Вставте ключ:\n`{key}`\n"
+            "3. Підключіться."
+        ),
+        "vpn_status": "Статус VPN: Активний (VLESS)",
+        "unknown_device": "Оберіть пристрій зі списку.",
+        "choose_country": "У якій країні ви перебуваєте?",
+        "ukraine_warning": (
+            "Увага: українські оператори блокують IP серверів РФ.\n"
+            "Рекомендуємо використовувати сервер Нідерланди 🇳🇱."
+        ),
+        "recommendations": (
+            "Рекомендації:\n"
+            "• Перевірте інтернет\n"
+            "• Перезапустіть застосунок\n"
+            "• Увімкніть/вимкніть VPN\n"
+            "• Перевірте налаштування"
+        ),
+        "rate_prompt": "Радий допомогти! Оцініть якість від 1 до 5:",
+        "describe_problem": "Опишіть проблему детально, ми зв'яжемося з вами.",
+        "rating_low": "Шкода, що не все сподобалося. Будь ласка, розкажіть, що не влаштувало.",
+        "feedback_thanks": "Дякуємо за зворотний зв'язок! Ми працюємо над покращенням.",
+        "ticket_accepted": (
+            "Дякуємо! Вашу заявку прийнято.\nКод звернення: {code}\n"
+            "Менеджер зв'яжеться з вами найближчим часом.\nБудь ласка, оцініть сервіс від 1 до 5."
+        ),
+        "idea_thanks": "Дякуємо за вашу ідею! Ми обов'язково її розглянемо.",
+        "ticket_reply": "Відповідь менеджера щодо заявки {code}:\n{text}",
+        "ticket_closed": "Заявку {code} закрито. Якщо проблема залишилась, створіть нове звернення через /start.",
+        "ticket_reply_prompt": "Напишіть відповідь щодо заявки {code} одним повідомленням.",
+        "ticket_reply_sent": "Відповідь передано менеджеру.",
+        "throttled": "Занадто часто, зачекайте трохи й спробуйте знову.",
+        "btn_ticket_reply": "Відповісти",
+        "unknown": "Використовуйте команди /start або кнопки меню для навігації.",
+        "farewells": (
+            "Дякуємо за звернення! Завжди раді допомогти.",
+            "Залишайтеся на зв'язку та безпечного інтернету!",
+            "Якщо що — звертайтеся, LKN VPN 24/7.",
+            "Бажаємо вам чудового дня і стабільного VPN.",
+        ),
+        "btn_how_connect": "Як підключити VPN",
+        "btn_vpn_not_work": "Не працює VPN",
+        "btn_logs": "Збір IP і логів",
+        "btn_subscription": "Підписка (актуально)",
+        "btn_ideas": "Запропонувати ідею",
+        "btn_rf_server": "Сервер РФ — особливості",
+        "btn_admin": "Адмін-панель",
+        "btn_resolved": "Вирішено",
+        "btn_not_resolved": "Не вирішено",
+        "server_Russia": "Росія 🇷🇺",
+        "server_Netherlands": "Нідерланди 🇳🇱",
+        "countries": ("Україна", "Росія", "США", "Велика Британія", "Казахстан", "Білорусь", "Інша країна"),
+    },
+    "kz": {
+        "start": "🔐 LKN VPN қолдау қызметіне қош келдіңіз!\n\nАлдымен бірінші кодтық сөзді енгізіңіз.",
+        "codeword1_ok": "Тамаша! Енді екінші кодтық сөзді енгізіңіз.",
+        "codeword_wrong": "Кодтық сөз қате. Қайталап көріңіз.",
+        "choose_language": "Кодтық сөздер расталды. Тілді таңдаңыз / Choose language:",
+        "language_set": "Тіл орнатылды. Басты мәзір:",
+        "help": "Командалар:\n/start — Ботты іске қосу\n/help — Көмек\nНавигация үшін мәзір батырмаларын пайдаланыңыз.",
+        "choose_device": "Құрылғыны таңдаңыз:",
+        "choose_server": "Серверді таңдаңыз:",
+        "logs": "Біз тіркелу күнінен басқа жеке деректерді жинамаймыз.\nСіздің VPN толықтай анонимді.",
+        "paid_subscription": "Қазір VPN тегін.\nАқылы жазылым 2025 жылдың соңынан ерте жоспарланбайды.",
+        "ideas_prompt": "Өз идеяларыңыз бен ұсыныстарыңызды жазыңыз.",
+        "rf_server": (
+            "РФ серверлері тұрақты жұмыс істейді және РКН бұғаттамайды.\n"
+            "YouTube және басқа сервистерді шектеусіз көре аласыз."
+        ),
+        "access_denied": "Қолжетімділік жоқ",
+        "instruction_Android": (
+            "Android үшін нұсқаулық:\n"
+            "1. v2RayTun қолданбасын жүктеңіз.\n"
+            "2. '+' басып, 'Қолмен енгізу' таңдаңыз.\n"
+            "3. Кілтті қойыңыз:\n`{key}`\n"
+            "4. Қосылып, пайдаланыңыз."
+        ),
+        "instruction_iOS": (
+            "iOS үшін нұсқаулық:\n"
+            "1. ShadowRay жүктеңіз.\n"
+            "2. Кілтпен конфигурация қосыңыз:\n`{key}`\n"
+            "3. Қосылыңыз."
+        ),
+        "instruction_Windows": (
+            "Windows үшін нұсқаулық:\n"
+            "1. hiddify қолданбасын жүктеңіз.\n"
+            "2. '+' → 'Қолмен енгізу' басыңыз.\n"
+            "3. Кілтті қойыңыз:\n`{key}`\n"
+            "4. VPN қосыңыз."
+        ),
+        "instruction_MacOS": (
+            "MacOS үшін нұсқаулық:\n"
+            "1. ShadowRay немесе ұқсас қолданбаны жүктеңіз.\n"
+            "2. Кілтті қойыңыз:\n`{key}`\n"
+            "3. Қосылыңыз."
+        ),
+        "vpn_status": "VPN күйі: Белсенді (VLESS)",
+        "unknown_device": "Тізімнен құрылғыны таңдаңыз.",
+        "choose_country": "Сіз қай елдесіз?",
+        "ukraine_warning": (
+            "Назар аударыңыз: Украина операторлары РФ серверлерінің IP-ін бұғаттайды.\n"
+            "Нидерланды 🇳🇱 серверін пайдалануды ұсынамыз."
+        ),
+        "recommendations": (
+            "Ұсыныстар:\n"
+            "• Интернетті тексеріңіз\n"
+            "• Қолданбаны қайта іске қосыңыз\n"
+            "• VPN-ді қосып/өшіріңіз\n"
+            "• Баптауларды тексеріңіз"
+        ),
+        "rate_prompt": "Көмектескеніме қуаныштымын! Сапаны 1-ден 5-ке дейін бағалаңыз:",
+        "describe_problem": "Мәселені толық сипаттаңыз, біз сізбен байланысамыз.",
+        "rating_low": "Бәрі ұнамағанына өкінеміз. Не ұнамағанын айтып беріңізші.",
+        "feedback_thanks": "Кері байланыс үшін рахмет! Біз жақсарту үстінде жұмыс істеп жатырмыз.",
+        "ticket_accepted": (
+            "Рахмет! Өтінішіңіз қабылданды.\nӨтініш коды: {code}\n"
+            "Менеджер жақын арада сізбен байланысады.\nҚызметті 1-ден 5-ке дейін бағалаңыз."
+        ),
+        "idea_thanks": "Идеяңыз үшін рахмет! Біз оны міндетті түрде қарастырамыз.",
+        "ticket_reply": "{code} өтінімі бойынша менеджердің жауабы:\n{text}",
+        "ticket_closed": "{code} өтінімі жабылды. Мәселе шешілмесе, /start арқылы жаңа өтінім жасаңыз.",
+        "ticket_reply_prompt": "{code} өтінімі бойынша жауабыңызды бір хабарламамен жазыңыз.",
+        "ticket_reply_sent": "Жауап менеджерге жіберілді.",
+        "throttled": "Тым жиі, сәл күтіп, қайталап көріңіз.",
+        "btn_ticket_reply": "Жауап беру",
+        "unknown": "Навигация үшін /start командасын немесе мәзір батырмаларын пайдаланыңыз.",
+        "farewells": (
+            "Хабарласқаныңыз үшін рахмет! Әрқашан көмектесуге дайынбыз.",
+            "Байланыста болыңыз, интернетіңіз қауіпсіз болсын!",
+            "Қажет болса — хабарласыңыз, LKN VPN 24/7.",
+            "Сізге керемет күн және тұрақты VPN тілейміз.",
+        ),
+        "btn_how_connect": "VPN қалай қосу керек",
+        "btn_vpn_not_work": "VPN жұмыс істемейді",
+        "btn_logs": "IP және логтар жинау",
+        "btn_subscription": "Жазылым (өзекті)",
+        "btn_ideas": "Идея ұсыну",
+        "btn_rf_server": "РФ сервері — ерекшеліктері",
+        "btn_admin": "Әкімші панелі",
+        "btn_resolved": "Шешілді",
+        "btn_not_resolved": "Шешілмеді",
+        "server_Russia": "Ресей 🇷🇺",
+        "server_Netherlands": "Нидерланды 🇳🇱",
+        "countries": ("Украина", "Ресей", "АҚШ", "Ұлыбритания", "Қазақстан", "Беларусь", "Басқа ел"),
+    },
+    "by": {
+        "start": "🔐 Вітаем у падтрымцы LKN VPN!\n\nДля пачатку ўвядзіце першае кодавае слова.",
+        "codeword1_ok": "Выдатна! Цяпер увядзіце другое кодавае слова.",
+        "codeword_wrong": "Няправільнае кодавае слова. Паспрабуйце яшчэ раз.",
+        "choose_language": "Кодавыя словы пацверджаны. Абярыце мову / Choose language:",
+        "language_set": "Мова ўстаноўлена. Вось галоўнае меню:",
+        "help": "Каманды:\n/start — Запуск бота\n/help — Дапамога\nВыкарыстоўвайце кнопкі меню для навігацыі.",
+        "choose_device": "Абярыце прыладу:",
+        "choose_server": "Абярыце сервер:",
+        "logs": "Мы не збіраем асабістыя даныя, акрамя даты рэгістрацыі.\nВаш VPN абсалютна ананімны.",
+        "paid_subscription": "Зараз VPN бясплатны.\nПлатная падпіска плануецца не раней за канец 2025.",
+        "ideas_prompt": "Калі ласка, напішыце свае ідэі і прапановы.",
+        "rf_server": (
+            "Серверы РФ працуюць стабільна і не блакуюцца РКН.\n"
+            "Вы можаце глядзець YouTube і іншыя сэрвісы без абмежаванняў."
+        ),
+        "access_denied": "Доступ забаронены",
+        "instruction_Android": (
+            "Інструкцыя для Android:\n"
+            "1. Спампуйце праграму v2RayTun.\n"
+            "2. Націсніце '+' і абярыце 'Ручны ўвод'.\n"
+            "3. Устаўце ключ:\n`{key}`\n"
+            "4. Падключыцеся і карыстайцеся."
+        ),
+        "instruction_iOS": (
+            "Інструкцыя для iOS:\n"
+            "1. Спампуйце ShadowRay.\n"
+            "2. Дадайце канфігурацыю з ключом:\n`{key}`\n"
+            "3. Падключыцеся."
+        ),
+        "instruction_Windows": (
+            "Інструкцыя для Windows:\n"
+            "1. Спампуйце праграму hiddify.\n"
+            "2. Націсніце '+' → 'Ручны ўвод'.\n"
+            "3. Устаўце ключ:\n`{key}`\n"
+            "4. Уключыце VPN."
+        ),
+        "instruction_MacOS": (
+            "Інструкцыя для MacOS:\n"
+            "1. Спампуйце ShadowRay або аналаг.\n"
+            "2. Устаўце ключ:\n`{key}`\n"
+            "3. Падключыцеся."
+        ),
+        "vpn_status": "Статус VPN: Актыўна (VLESS)",
+        "unknown_device": "Абярыце прыладу са спісу.",
+        "choose_country": "У якой краіне вы знаходзіцеся?",
+        "ukraine_warning": (
+            "Увага: украінскія аператары блакуюць IP сервераў РФ.\n"
+            "Рэкамендуем выкарыстоўваць сервер Нідэрланды 🇳🇱."
+        ),
+        "recommendations": (
+            "Рэкамендацыі:\n"
+            "• Праверце інтэрнэт\n"
+            "• Перазапусціце праграму\n"
+            "• Уключыце/выключыце VPN\n"
+            "• Праверце налады"
+        ),
+        "rate_prompt": "Рады дапамагчы! Ацаніце якасць ад 1 да 5:",
+        "describe_problem": "Апішыце праблему падрабязна, мы звяжамся з вамі.",
+        "rating_low": "Шкада, што не ўсё спадабалася. Калі ласка, раскажыце, што не задаволіла.",
+        "feedback_thanks": "Дзякуй за зваротную сувязь! Мы працуем над паляпшэннем.",
+        "ticket_accepted": (
+            "Дзякуй! Ваша заяўка прынята.\nКод звароту: {code}\n"
+            "Менеджар звяжацца з вамі ў бліжэйшы час.\nКалі ласка, ацаніце сэрвіс ад 1 да 5."
+        ),
+        "idea_thanks": "Дзякуй за вашу ідэю! Мы абавязкова яе разгледзім.",
+        "ticket_reply": "Адказ менеджара па заяўцы {code}:\n{text}",
+        "ticket_closed": "Заяўка {code} закрыта. Калі праблема засталася, стварыце новы зварот праз /start.",
+        "ticket_reply_prompt": "Напішыце адказ па заяўцы {code} адным паведамленнем.",
+        "ticket_reply_sent": "Адказ перададзены менеджару.",
+        "throttled": "Занадта часта, пачакайце крыху і паспрабуйце зноў.",
+        "btn_ticket_reply": "Адказаць",
+        "unknown": "Выкарыстоўвайце каманду /start або кнопкі меню для навігацыі.",
+        "farewells": (
+            "Дзякуй за зварот! Заўсёды рады дапамагчы.",
+            "Будзьце на сувязі і бяспечнага інтэрнэту!",
+            "Калі што — звяртайцеся, LKN VPN 24/7.",
+            "Жадаем вам выдатнага дня і стабільнага VPN.",
+        ),
+        "btn_how_connect": "Як падключыць VPN",
+        "btn_vpn_not_work": "Не працуе VPN",
+        "btn_logs": "Збор IP і логаў",
+        "btn_subscription": "Падпіска (актуальна)",
+        "btn_ideas": "Прапанаваць ідэю",
+        "btn_rf_server": "Сервер РФ — асаблівасці",
+        "btn_admin": "Адмін-панэль",
+        "btn_resolved": "Вырашана",
+        "btn_not_resolved": "Не вырашана",
+        "server_Russia": "Расія 🇷🇺",
+        "server_Netherlands": "Нідэрланды 🇳🇱",
+        "countries": ("Украіна", "Расія", "ЗША", "Вялікабрытанія", "Казахстан", "Беларусь", "Іншая краіна"),
+    },
+    "en": {
+        "start": "🔐 Welcome to LKN VPN support!\n\nTo begin, enter the first code word.",
+        "codeword1_ok": "Great! Now enter the second code word.",
+        "codeword_wrong": "Wrong code word. Please try again.",
+        "choose_language": "Code words confirmed. Выберите язык / Choose language:",
+        "language_set": "Language set. Here is the main menu:",
+        "help": "Commands:\n/start — Start the bot\n/help — Help\nUse the menu buttons to navigate.",
+        "choose_device": "Choose your device:",
+        "choose_server": "Choose a server:",
+        "logs": "We collect no personal data except the registration date.\nYour VPN is completely anonymous.",
+        "paid_subscription": "VPN is currently free.\nA paid subscription is not planned before the end of 2025.",
+        "ideas_prompt": "Please write your ideas and suggestions.",
+        "rf_server": (
+            "Russian servers are stable and are not blocked by Roskomnadzor.\n"
+            "You can watch YouTube and other services without restrictions."
+        ),
+        "access_denied": "Access denied",
+        "instruction_Android": (
+            "Android instructions:\n"
+            "1. Install the v2RayTun app.\n"
+            "2. Tap '+' and choose 'Manual input'.\n"
+            "3. Paste the key:\n`{key}`\n"
+            "4. Connect and enjoy."
+        ),
+        "instruction_iOS": (
+            "iOS instructions:\n"
+            "1. Install ShadowRay.\n"
+            "2. Add a configuration with the key:\n`{key}`\n"
+            "3. Connect."
+        ),
+        "instruction_Windows": (
+            "Windows instructions:\n"
+            "1. Install the hiddify app.\n"
+            "2. Click '+' → 'Manual input'.\n"
+            "3. Paste the key:\n`{key}`\n"
+            "4. Turn on the VPN."
+        ),
+        "instruction_MacOS": (
+            "MacOS instructions:\n"
+            "1. Install ShadowRay or a similar app.\n"
+            "2. Paste the key:\n`{key}`\n"
+            "3. Connect."
+        ),
+        "vpn_status": "VPN status: Active (VLESS)",
+        "unknown_device": "Choose a device from the list.",
+        "choose_country": "Which country are you in?",
+        "ukraine_warning": (
+            "Attention: Ukrainian carriers block the IPs of Russian servers.\n"
+            "We recommend the Netherlands 🇳🇱 server."
+        ),
+        "recommendations": (
+            "Recommendations:\n"
+            "• Check your internet connection\n"
+            "• Restart the app\n"
+            "• Turn the VPN off and on\n"
+            "• Check the settings"
+        ),
+        "rate_prompt": "Glad to help! Rate the quality from 1 to 5:",
+        "describe_problem": "Describe the problem in detail and we will contact you.",
+        "rating_low": "Sorry you were not satisfied. Please tell us what went wrong.",
+        "feedback_thanks": "Thank you for the feedback! We are working on improvements.",
+        "ticket_accepted": (
+            "Thank you! Your request has been received.\nRequest code: {code}\n"
+            "A manager will contact you shortly.\nPlease rate the service from 1 to 5."
+        ),
+        "idea_thanks": "Thank you for your idea! We will definitely consider it.",
+        "ticket_reply": "Manager reply on request {code}:\n{text}",
+        "ticket_closed": "Request {code} is closed. If the problem persists, open a new request via /start.",
+        "ticket_reply_prompt": "Write your reply on request {code} in one message.",
+        "ticket_reply_sent": "Your reply has been passed to the manager.",
+        "throttled": "Too many requests, please wait a moment and try again.",
+        "btn_ticket_reply": "Reply",
+        "unknown": "Use the /start command or the menu buttons to navigate.",
+        "farewells": (
+            "Thank you for reaching out! Always happy to help.",
+            "Stay in touch and stay safe online!",
+            "Anything else — just write, LKN VPN 24/7.",
+            "Have a great day and a stable VPN.",
+        ),
+        "btn_how_connect": "How to connect VPN",
+        "btn_vpn_not_work": "VPN is not working",
+        "btn_logs": "IP and log collection",
+        "btn_subscription": "Subscription (current)",
+        "btn_ideas": "Suggest an idea",
+        "btn_rf_server": "Russian server — details",
+        "btn_admin": "Admin panel",
+        "btn_resolved": "Solved",
+        "btn_not_resolved": "Not solved",
+        "server_Russia": "Russia 🇷🇺",
+        "server_Netherlands": "Netherlands 🇳🇱",
+        "countries": ("Ukraine", "Russia", "USA", "United Kingdom", "Kazakhstan", "Belarus", "Other country"),
+    },
+    "pl": {
+        "start": "🔐 Witamy we wsparciu LKN VPN!\n\nNa początek wpisz pierwsze słowo kodowe.",
+        "codeword1_ok": "Świetnie! Teraz wpisz drugie słowo kodowe.",
+        "codeword_wrong": "Nieprawidłowe słowo kodowe. Spróbuj ponownie.",
+        "choose_language": "Słowa kodowe potwierdzone. Wybierz język / Choose language:",
+        "language_set": "Język ustawiony. Oto menu główne:",
+        "help": "Polecenia:\n/start — Uruchomienie bota\n/help — Pomoc\nDo nawigacji używaj przycisków menu.",
+        "choose_device": "Wybierz urządzenie:",
+        "choose_server": "Wybierz serwer:",
+        "logs": "Nie zbieramy danych osobowych poza datą rejestracji.\nTwój VPN jest całkowicie anonimowy.",
+        "paid_subscription": "Obecnie VPN jest darmowy.\nPłatna subskrypcja nie jest planowana przed końcem 2025.",
+        "ideas_prompt": "Napisz, proszę, swoje pomysły i sugestie.",
+        "rf_server": (
+            "Serwery w Rosji działają stabilnie i nie są blokowane przez Roskomnadzor.\n"
+            "Możesz oglądać YouTube i inne serwisy bez ograniczeń."
+        ),
+        "access_denied": "Brak dostępu",
+        "instruction_Android": (
+            "Instrukcja dla Androida:\n"
+            "1. Pobierz aplikację v2RayTun.\n"
+            "2. Naciśnij '+' i wybierz 'Wprowadzanie ręczne'.\n"
+            "3. Wklej klucz:\n`{key}`\n"
+            "4. Połącz się i korzystaj."
+        ),
+        "instruction_iOS": (
+            "Instrukcja dla iOS:\n"
+            "1. Pobierz ShadowRay.\n"
+            "2. Dodaj konfigurację z kluczem:\n`{key}`\n"
+            "3. Połącz się."
+        ),
+        "instruction_Windows": (
+            "Instrukcja dla Windows:\n"
+            "1. Pobierz aplikację hiddify.\n"
+            "2. Naciśnij '+' → 'Wprowadzanie ręczne'.\n"
+            "3. Wklej klucz:\n`{key}`\n"
+            "4. Włącz VPN."
+        ),
+        "instruction_MacOS": (
+            "Instrukcja dla MacOS:\n"
+            "1. Pobierz ShadowRay lub podobną aplikację.\n"
+            "2. Wklej klucz:\n`{key}`\n"
+            "3. Połącz się."
+        ),
+        "vpn_status": "Status VPN: Aktywny (VLESS)",
+        "unknown_device": "Wybierz urządzenie z listy.",
+        "choose_country": "W jakim kraju się znajdujesz?",
+        "ukraine_warning": (
+            "Uwaga: ukraińscy operatorzy blokują IP serwerów w Rosji.\n"
+            "Zalecamy serwer w Holandii 🇳🇱."
+        ),
+        "recommendations": (
+            "Zalecenia:\n"
+            "• Sprawdź połączenie z internetem\n"
+            "• Uruchom ponownie aplikację\n"
+            "• Wyłącz i włącz VPN\n"
+            "• Sprawdź ustawienia"
+        ),
+        "rate_prompt": "Cieszę się, że mogłem pomóc! Oceń jakość od 1 do 5:",
+        "describe_problem": "Opisz szczegółowo problem, skontaktujemy się z Tobą.",
+        "rating_low": "Przykro nam, że nie wszystko się podobało. Napisz, proszę, co było nie tak.",
+        "feedback_thanks": "Dziękujemy za opinię! Pracujemy nad ulepszeniami.",
+        "ticket_accepted": (
+            "Dziękujemy! Twoje zgłoszenie zostało przyjęte.\nKod zgłoszenia: {code}\n"
+            "Menedżer wkrótce się z Tobą skontaktuje.\nOceń, proszę, obsługę od 1 do 5."
+        ),
+        "idea_thanks": "Dziękujemy za pomysł! Na pewno go rozważymy.",
+        "ticket_reply": "Odpowiedź menedżera w sprawie zgłoszenia {code}:\n{text}",
+        "ticket_closed": "Zgłoszenie {code} zostało zamknięte. Jeśli problem nadal występuje, utwórz nowe zgłoszenie przez /start.",
+        "ticket_reply_prompt": "Napisz odpowiedź w sprawie zgłoszenia {code} w jednej wiadomości.",
+        "ticket_reply_sent": "Odpowiedź przekazano menedżerowi.",
+        "throttled": "Zbyt często, odczekaj chwilę i spróbuj ponownie.",
+        "btn_ticket_reply": "Odpowiedz",
+        "unknown": "Do nawigacji używaj polecenia /start lub przycisków menu.",
+        "farewells": (
+            "Dziękujemy za kontakt! Zawsze chętnie pomożemy.",
+            "Bądź w kontakcie i korzystaj z bezpiecznego internetu!",
+            "W razie czego — pisz, LKN VPN 24/7.",
+            "Życzymy udanego dnia i stabilnego VPN.",
+        ),
+        "btn_how_connect": "Jak podłączyć VPN",
+        "btn_vpn_not_work": "VPN nie działa",
+        "btn_logs": "Zbieranie IP i logów",
+        "btn_subscription": "Subskrypcja (aktualnie)",
+        "btn_ideas": "Zaproponuj pomysł",
+        "btn_rf_server": "Serwer w Rosji — szczegóły",
+        "btn_admin": "Panel administratora",
+        "btn_resolved": "Rozwiązane",
+        "btn_not_resolved": "Nierozwiązane",
+        "server_Russia": "Rosja 🇷🇺",
+        "server_Netherlands": "Holandia 🇳🇱",
+        "countries": ("Ukraina", "Rosja", "USA", "Wielka Brytania", "Kazachstan", "Białoruś", "Inny kraj"),
+    },
+}
+
+
+class Locale(NamedTuple):
+    code: str
+    texts: Mapping[str, str]
+    keyboards: Mapping[str, types.InlineKeyboardMarkup]
+    farewells: Tuple[str, ...]
+    # Устройство -> (текст до ключа, текст после ключа) для персональных ключей
+    instructions: Mapping[str, Tuple[str, str]]
+
+
+# --- Сборка клавиатур ---
+
+def _main_menu(t):
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text=t["btn_how_connect"], callback_data="how_connect"),
+        types.InlineKeyboardButton(text=t["btn_vpn_not_work"], callback_data="vpn_not_work"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text=t["btn_logs"], callback_data="logs"),
+        types.InlineKeyboardButton(text=t["btn_subscription"], callback_data="paid_subscription"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text=t["btn_ideas"], callback_data="ideas"),
+        types.InlineKeyboardButton(text=t["btn_rf_server"], callback_data="rf_server"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(text=t["btn_admin"], callback_data="admin_panel"),
+    )
+    return kb.as_markup()
+
+def _device_menu(devices):
+    kb = InlineKeyboardBuilder()
+    for device in devices:
+        kb.button(text=device, callback_data=f"device_{device}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+def _server_menu(t, servers):
+    kb = InlineKeyboardBuilder()
+    kb.row(*(
+        types.InlineKeyboardButton(text=t[f"server_{server}"], callback_data=f"server_{server}")
+        for server in servers
+    ))
+    return kb.as_markup()
+
+def _countries_menu(t, countries):
+    kb = InlineKeyboardBuilder()
+    for country, label in zip(countries, t["countries"]):
+        kb.button(text=label, callback_data=f"country_{country}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+def _resolve_menu(t):
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text=t["btn_resolved"], callback_data="resolved"),
+        types.InlineKeyboardButton(text=t["btn_not_resolved"], callback_data="not_resolved"),
+    )
+    return kb.as_markup()
+
+def _rating_keyboard():
+    kb = InlineKeyboardBuilder()
+    for i in range(1, 6):
+        kb.button(text=str(i), callback_data=f"rating_{i}")
+    kb.adjust(5)
+    return kb.as_markup()
+
+def _admin_menu():
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        types.InlineKeyboardButton(text="Просмотр обращений", callback_data="admin_tickets"),
+        types.InlineKeyboardButton(text="Статистика", callback_data="admin_stats"),
+    )
+    return kb.as_markup()
+
+def _language_menu(languages):
+    kb = InlineKeyboardBuilder()
+    for code, name in languages.items():
+        kb.button(text=name, callback_data=f"lang_{code}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+class Catalog:
+    """
+    Готовые тексты и клавиатуры для всех языков из languages.
+
+    По умолчанию собирается из констант этого модуля; settings.py передаёт
+    сюда содержимое файла настроек. texts — тексты по языкам, язык без
+    своих текстов получает тексты DEFAULT_LANGUAGE.
+    """
+
+    def __init__(
+        self,
+        key_text: str = KEY_PLACEHOLDER,
+        languages: Mapping[str, str] = LANGUAGES,
+        devices: Tuple[str, ...] = DEVICES,
+        servers: Tuple[str, ...] = SERVERS,
+        countries: Tuple[str, ...] = COUNTRIES,
+        texts: Mapping[str, Mapping] = TEXTS,
+    ):
+        self.languages = MappingProxyType(dict(languages))
+        self.devices = tuple(devices)
+        self.servers = tuple(servers)
+        self.countries = tuple(countries)
+        # Клавиатуры без текста на языке пользователя общие для всех локалей
+        shared = {
+            "device": _device_menu(self.devices),
+            "rating": _rating_keyboard(),
+            "admin": _admin_menu(),
+            "language": _language_menu(self.languages),
+        }
+        locales = {}
+        for code in self.languages:
+            t = texts.get(code, texts[DEFAULT_LANGUAGE])
+            strings = {k: v for k, v in t.items() if isinstance(v, str)}
+            instructions = {}
+            for device in self.devices:
+                strings[f"instruction_{device}"] = (
+                    t[f"instruction_{device}"].format(key=key_text) + "\n\n" + t["vpn_status"]
+                )
+                before, _, after = t[f"instruction_{device}"].format(key=_KEY_MARKER).partition(_KEY_MARKER)
+                instructions[device] = (before, after + "\n\n" + t["vpn_status"])
+            strings["recommendations"] = t["recommendations"] + "\n\n" + t["vpn_status"]
+            keyboards = dict(shared)
+            keyboards.update(
+                main=_main_menu(t),
+                server=_server_menu(t, self.servers),
+                countries=_countries_menu(t, self.countries),
+                resolve=_resolve_menu(t),
+            )
+            locales[code] = Locale(
+                code=code,
+                texts=MappingProxyType(strings),
+                keyboards=MappingProxyType(keyboards),
+                farewells=tuple(t["farewells"]),
+                instructions=MappingProxyType(instructions),
+            )
+        self._locales = MappingProxyType(locales)
+
+    def get(self, lang) -> Locale:
+        return self._locales.get(lang) or self._locales[DEFAULT_LANGUAGE]
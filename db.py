@@ -0,0 +1,1138 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import re
+import sqlite3
+import string
+import threading
+import time
+import unicodedata
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from cache import TTLCache
+from metrics import DB_ERRORS, DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# --- Схема базы ---
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tickets (
+        code TEXT PRIMARY KEY,
+        user_id INTEGER,
+        problem TEXT,
+        status TEXT,
+        created_at TEXT,
+        created_ts INTEGER,
+        manager_id INTEGER,
+        updated_ts INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS problem_feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT,
+        count INTEGER DEFAULT 1,
+        fingerprint TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS problem_samples (
+        fingerprint TEXT,
+        description TEXT,
+        count INTEGER DEFAULT 1,
+        PRIMARY KEY (fingerprint, description)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ideas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        idea TEXT,
+        created_at TEXT,
+        created_ts INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        rating INTEGER,
+        created_at TEXT,
+        created_ts INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sequences (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO sequences (name, value) VALUES ('tickets', 0)",
+    """
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        expires_at REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        payload TEXT,
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at REAL,
+        created_at REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        language TEXT DEFAULT 'ru',
+        last_interaction TEXT
+    )
+    """,
+    # Персональные ключи VPN: свободные (user_id IS NULL) выдаются по одному
+    """
+    CREATE TABLE IF NOT EXISTS vpn_keys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        user_id INTEGER UNIQUE,
+        created_at REAL,
+        assigned_at REAL
+    )
+    """,
+    # Старые строки, перенесённые из рабочих таблиц пачками: data — сжатый
+    # zlib JSON-массив строк, columns — имена колонок
+    """
+    CREATE TABLE IF NOT EXISTS archive (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        columns TEXT,
+        data BLOB,
+        rows INTEGER,
+        first_ts INTEGER,
+        last_ts INTEGER,
+        archived_at REAL
+    )
+    """,
+)
+
+# --- Время создания ---
+# created_at — московское время строкой (как его пишет бот), created_ts —
+# то же время в секундах Unix. По created_ts идут выборки по диапазону.
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CREATED_TS_TABLES = ("tickets", "ratings", "ideas")
+
+
+def moscow_epoch(created_at):
+    if not created_at:
+        return None
+    try:
+        return int(datetime.strptime(created_at, TIMESTAMP_FORMAT).replace(tzinfo=MOSCOW_TZ).timestamp())
+    except ValueError:
+        return None
+
+
+def _upgrade_created_ts(conn):
+    conn.create_function("moscow_epoch", 1, moscow_epoch, deterministic=True)
+    for table in CREATED_TS_TABLES:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "created_ts" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN created_ts INTEGER")
+            conn.execute(f"UPDATE {table} SET created_ts = moscow_epoch(created_at)")
+
+
+def _upgrade_ticket_lifecycle(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tickets)")}
+    if "manager_id" not in columns:
+        conn.execute("ALTER TABLE tickets ADD COLUMN manager_id INTEGER")
+    if "updated_ts" not in columns:
+        conn.execute("ALTER TABLE tickets ADD COLUMN updated_ts INTEGER")
+        conn.execute("UPDATE tickets SET updated_ts = created_ts")
+
+
+def archived_rows(conn, kind):
+    """Строки из архива в виде словарей, пачка за пачкой."""
+    for columns, data in conn.execute("SELECT columns, data FROM archive WHERE kind = ? ORDER BY id", (kind,)):
+        names = json.loads(columns)
+        for values in json.loads(zlib.decompress(data)):
+            yield dict(zip(names, values))
+
+# --- Статистика ---
+# Агрегаты хранятся в таблице stats: (metric, bucket) -> value. bucket — это
+# "" для итога за всё время, "YYYY-MM-DD" для дня и "YYYY-MM-DD HH" для часа;
+# created_at пишется по Москве (now_moscow), поэтому и корзины московские.
+# Таблица обновляется триггерами в той же транзакции, что и сама вставка,
+# и целиком пересчитывается из сырых данных через StatsRepository.rebuild().
+STATS_SOURCES = (
+    # (metric, таблица, выражение)
+    ("tickets", "tickets", "1"),
+    ("ratings", "ratings", "1"),
+    ("rating_sum", "ratings", "rating"),
+    ("ideas", "ideas", "1"),
+)
+_DAY, _HOUR = 10, 13  # длина префикса created_at для дневной и часовой корзины
+
+
+def _stats_upsert(metric, bucket_sql, value_sql):
+    return (
+        f"INSERT INTO stats (metric, bucket, value) VALUES ('{metric}', {bucket_sql}, {value_sql}) "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def _stats_triggers():
+    tables = {}
+    for metric, table, expr in STATS_SOURCES:
+        value = "NEW." + expr if expr != "1" else "1"
+        tables.setdefault(table, []).extend((
+            _stats_upsert(metric, "''", value),
+            _stats_upsert(metric, f"substr(NEW.created_at, 1, {_DAY})", value),
+            _stats_upsert(metric, f"substr(NEW.created_at, 1, {_HOUR})", value),
+        ))
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table} AFTER INSERT ON {table} BEGIN\n"
+        + "\n".join(body) + "\nEND"
+        for table, body in tables.items()
+    ]
+    # Отзывы о проблемах считаем только итогом: у problem_feedback нет даты
+    triggers.append(
+        "CREATE TRIGGER IF NOT EXISTS stats_problem_feedback_insert AFTER INSERT ON problem_feedback BEGIN\n"
+        + _stats_upsert("feedback", "''", "NEW.count") + "\nEND"
+    )
+    triggers.append(
+        "CREATE TRIGGER IF NOT EXISTS stats_problem_feedback_update AFTER UPDATE OF count ON problem_feedback BEGIN\n"
+        + _stats_upsert("feedback", "''", "NEW.count - OLD.count") + "\nEND"
+    )
+    return tuple(triggers)
+
+
+STATS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS stats (
+        metric TEXT,
+        bucket TEXT,
+        value INTEGER,
+        PRIMARY KEY (metric, bucket)
+    )
+    """,
+) + _stats_triggers()
+
+
+def _rebuild_stats(conn):
+    conn.execute("DELETE FROM stats")
+    for metric, table, expr in STATS_SOURCES:
+        conn.execute(
+            f"INSERT INTO stats (metric, bucket, value) SELECT '{metric}', '', COALESCE(SUM({expr}), 0) FROM {table}"
+        )
+        for length in (_DAY, _HOUR):
+            conn.execute(
+                f"INSERT INTO stats (metric, bucket, value) "
+                f"SELECT '{metric}', substr(created_at, 1, {length}), SUM({expr}) FROM {table} "
+                f"WHERE created_at IS NOT NULL GROUP BY 2"
+            )
+    conn.execute(
+        "INSERT INTO stats (metric, bucket, value) SELECT 'feedback', '', COALESCE(SUM(count), 0) FROM problem_feedback"
+    )
+
+    # Строки, перенесённые в архив, тоже входят в статистику
+    archived = {}
+    for metric, table, expr in STATS_SOURCES:
+        for row in archived_rows(conn, table):
+            value = 1 if expr == "1" else row[expr]
+            created_at = row.get("created_at")
+            buckets = ("", created_at[:_DAY], created_at[:_HOUR]) if created_at else ("",)
+            for bucket in buckets:
+                archived[metric, bucket] = archived.get((metric, bucket), 0) + value
+    conn.executemany(
+        "INSERT INTO stats (metric, bucket, value) VALUES (?, ?, ?) "
+        "ON CONFLICT(metric, bucket) DO UPDATE SET value = value + excluded.value",
+        [(metric, bucket, value) for (metric, bucket), value in archived.items()],
+    )
+
+
+# --- Полнотекстовый поиск ---
+# Один индекс FTS5 на тексты заявок, идей и отзывов о проблемах. Индекс
+# без собственной копии текста (content=''): rowid записи — rowid исходной
+# строки * 4 + номер источника, по нему результат находится в своей таблице.
+# Триггеры держат индекс в той же транзакции, что и изменение строки;
+# удаление из такого индекса требует прежний текст, он есть в OLD.
+# unicode61 разбивает на слова и приводит к нижнему регистру и кириллицу;
+# «ё» заменяется на «е» в триггерах и в search_query(), чтобы «всё» находилось
+# по «все». Слово ищется по началу, и не длиннее SEARCH_PREFIX букв: для
+# таких начал есть готовые prefix-индексы, а заодно отбрасываются окончания
+# («подключения» найдёт и «подключение»).
+SEARCH_SOURCES = (
+    # (номер, таблица, колонка)
+    (1, "tickets", "problem"),
+    (2, "ideas", "idea"),
+    (3, "problem_feedback", "description"),
+)
+SEARCH_KINDS = {number: table for number, table, _ in SEARCH_SOURCES}
+SEARCH_PREFIX = 6
+# rowid в индексе — номер источника в старших битах, rowid строки в младших:
+# у каждой таблицы свой непрерывный диапазон, и внутри него rowid растёт со
+# временем, как и в самой таблице
+SEARCH_KIND_SHIFT = 40
+# Ранжируются только последние SEARCH_WINDOW совпадений каждой таблицы: так
+# частые слова на миллионах строк не заставляют считать bm25 по каждому документу
+SEARCH_WINDOW = 1000
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+
+def _search_body(value):
+    return f"replace(replace({value}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _search_triggers():
+    triggers = []
+    for number, table, column in SEARCH_SOURCES:
+        base = number << SEARCH_KIND_SHIFT
+        insert = f"INSERT INTO search (rowid, body) VALUES (NEW.rowid + {base}, {_search_body('NEW.' + column)});"
+        delete = (
+            f"INSERT INTO search (search, rowid, body) "
+            f"VALUES ('delete', OLD.rowid + {base}, {_search_body('OLD.' + column)});"
+        )
+        triggers.append(f"CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN\n{insert}\nEND")
+        triggers.append(f"CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN\n{delete}\nEND")
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {column} ON {table} BEGIN\n"
+            f"{delete}\n{insert}\nEND"
+        )
+    return tuple(triggers)
+
+
+SEARCH_SCHEMA = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+        body,
+        content = '',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4 5 6'
+    )
+    """,
+) + _search_triggers()
+
+
+def _rebuild_search(conn):
+    conn.execute("INSERT INTO search (search) VALUES ('delete-all')")
+    for number, table, column in SEARCH_SOURCES:
+        conn.execute(
+            f"INSERT INTO search (rowid, body) SELECT rowid + {number << SEARCH_KIND_SHIFT}, {_search_body(column)} "
+            f"FROM {table} "
+            f"WHERE {column} IS NOT NULL"
+        )
+
+
+def search_query(text: str):
+    """
+    Запрос пользователя → выражение MATCH: каждое слово ищется по началу
+    (не длиннее SEARCH_PREFIX букв), все слова обязательны.
+    «впн не работает» → '"впн"* "не"* "работа"*'.
+    None, если слов нет.
+    """
+    text = unicodedata.normalize("NFKC", text).replace("ё", "е").replace("Ё", "Е")
+    words = _SEARCH_TOKEN_RE.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word[:SEARCH_PREFIX]}"*' for word in words)
+
+
+# Индексы создаются после миграций: им могут быть нужны добавленные колонки
+INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_problem_feedback_fingerprint ON problem_feedback(fingerprint)",
+    "CREATE INDEX IF NOT EXISTS idx_problem_feedback_count ON problem_feedback(count DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_fsm_states_expires_at ON fsm_states(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt_at ON outbox(next_attempt_at)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at, code)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_status_created_at ON tickets(status, created_at, code)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_user_created_at ON tickets(user_id, created_at, code)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_status_created_ts ON tickets(status, created_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_created_ts ON tickets(created_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_ratings_created_ts ON ratings(created_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_ideas_created_ts ON ideas(created_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_archive_kind ON archive(kind, last_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_vpn_keys_free ON vpn_keys(id) WHERE user_id IS NULL",
+)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_problem(text: str) -> str:
+    """Нижний регистр, без пунктуации, пробелы схлопнуты: «VPN не работает!» → «vpn не работает»."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def problem_fingerprint(text: str) -> str:
+    normalized = normalize_problem(text) or text.strip().casefold()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- Коды обращений ---
+# Код — это номер из последовательности, перемешанный сетью Фейстеля над
+# двумя половинами по 3 символа. Перестановка взаимно однозначна на всём
+# пространстве 36^6, поэтому разные номера всегда дают разные коды, а
+# проверять занятость кода чтением из базы не нужно.
+TICKET_ALPHABET = string.ascii_uppercase + string.digits
+TICKET_CODE_LENGTH = 6
+_HALF = len(TICKET_ALPHABET) ** (TICKET_CODE_LENGTH // 2)
+TICKET_CODE_SPACE = _HALF * _HALF
+_FEISTEL_ROUNDS = 4
+
+
+def _feistel_round(key: bytes, rnd: int, value: int) -> int:
+    digest = hashlib.blake2b(value.to_bytes(4, "big"), key=key, salt=rnd.to_bytes(16, "big"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big") % _HALF
+
+
+def ticket_code(number: int, key: bytes) -> str:
+    """Номер последовательности → 6-символьный код вида «K7Q2ZD»."""
+    if not 0 <= number < TICKET_CODE_SPACE:
+        raise ValueError("Пространство кодов обращений исчерпано")
+    left, right = divmod(number, _HALF)
+    for rnd in range(_FEISTEL_ROUNDS):
+        left, right = right, (left + _feistel_round(key, rnd, right)) % _HALF
+    value = left * _HALF + right
+    chars = []
+    for _ in range(TICKET_CODE_LENGTH):
+        value, digit = divmod(value, len(TICKET_ALPHABET))
+        chars.append(TICKET_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _upgrade_problem_feedback(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(problem_feedback)")}
+    if "fingerprint" in columns:
+        return
+    conn.execute("ALTER TABLE problem_feedback ADD COLUMN fingerprint TEXT")
+
+    # Склеиваем старые строки, которые после нормализации совпали
+    groups = {}
+    for pid, description, count in conn.execute("SELECT id, description, count FROM problem_feedback"):
+        groups.setdefault(problem_fingerprint(description), []).append((count or 0, pid, description))
+    for fingerprint, rows in groups.items():
+        rows.sort(reverse=True)
+        _, keep_id, _ = rows[0]
+        conn.execute(
+            "UPDATE problem_feedback SET fingerprint = ?, count = ? WHERE id = ?",
+            (fingerprint, sum(count for count, _, _ in rows), keep_id),
+        )
+        conn.executemany("DELETE FROM problem_feedback WHERE id = ?", [(pid,) for _, pid, _ in rows[1:]])
+        conn.executemany(
+            "INSERT OR IGNORE INTO problem_samples (fingerprint, description, count) VALUES (?, ?, ?)",
+            [(fingerprint, description, count) for count, _, description in rows],
+        )
+
+
+# --- Миграции ---
+# Версия схемы — в PRAGMA user_version, каждая миграция выполняется один раз.
+# Изменение схемы — новая функция в конце MIGRATIONS; старые не меняются.
+# Версия 1 приводит к текущему виду и новую базу, и базу, созданную до
+# появления версий: проверки в _upgrade_* не повторяют уже сделанное.
+
+def _migration_1(conn):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for statement in SCHEMA:
+        conn.execute(statement)
+    # Старые строки приводим к текущему виду до создания триггеров статистики
+    # и поиска: удаление склеенных отзывов иначе пошло бы в ещё пустой индекс
+    # FTS, а 'delete' несуществующей строки портит contentless-индекс
+    _upgrade_problem_feedback(conn)
+    _upgrade_created_ts(conn)
+    _upgrade_ticket_lifecycle(conn)
+    for statement in STATS_SCHEMA + SEARCH_SCHEMA:
+        conn.execute(statement)
+    if "stats" not in existing:
+        # Первый запуск со статистикой — заполняем её из уже накопленных данных
+        _rebuild_stats(conn)
+    if "search" not in existing:
+        _rebuild_search(conn)
+    for statement in INDEXES:
+        conn.execute(statement)
+
+
+def _migration_2(conn):
+    # Поисковый индекс: номер источника переехал из младших битов rowid в
+    # старшие, чтобы окно последних совпадений бралось по каждой таблице
+    for _, table, _ in SEARCH_SOURCES:
+        for event in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS search_{table}_{event}")
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    _rebuild_search(conn)
+
+
+MIGRATIONS = (_migration_1, _migration_2)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+class Database:
+    """
+    Асинхронная обёртка над SQLite.
+
+    Все запросы выполняются вне event loop: запись идёт через один
+    поток-писатель, чтение — через пул потоков-читателей. У каждого потока
+    своё соединение, у каждой операции — свой курсор.
+    """
+
+    def __init__(self, path: str, readers: int = 4, ticket_secret: str = "lknvpn"):
+        self.path = path
+        self.buffer = None
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+
+        self.tickets = TicketRepository(self, hashlib.sha256(ticket_secret.encode("utf-8")).digest())
+        self.ratings = RatingRepository(self)
+        self.ideas = IdeaRepository(self)
+        self.problems = ProblemFeedbackRepository(self)
+        self.users = UserRepository(self)
+        self.stats = StatsRepository(self)
+        self.search = SearchRepository(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # Действует только на новую базу (до WAL и первой таблицы): свободные
+        # страницы отдаются по частям через incremental_vacuum. Старые базы
+        # переводит в этот режим Maintenance
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _run_write(self, fn, args):
+        conn = self._connection()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _run_read(self, fn, args):
+        return fn(self._connection(), *args)
+
+    async def write(self, fn, *args):
+        """Выполнить fn(conn, *args) в потоке-писателе одной транзакцией."""
+        return await self._timed("write", self._writer, self._run_write, fn, args)
+
+    async def read(self, fn, *args):
+        """Выполнить fn(conn, *args) в одном из потоков-читателей."""
+        return await self._timed("read", self._readers, self._run_read, fn, args)
+
+    @staticmethod
+    async def _timed(kind, executor, run, fn, args):
+        loop = asyncio.get_running_loop()
+        # С именем класса: TicketRepository._get и UserRepository._get — разные операции
+        operation = fn.__qualname__
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, run, fn, args)
+        except Exception:
+            DB_ERRORS.inc(kind, operation)
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, kind, operation)
+
+    def start_buffer(self, max_batch: int = 100, max_delay_ms: int = 50):
+        """Включить отложенную запись для методов enqueue() репозиториев."""
+        self.buffer = WriteBehindQueue(self, max_batch=max_batch, max_delay_ms=max_delay_ms)
+        self.buffer.start()
+
+    async def aclose(self):
+        """Сбросить буфер отложенной записи и закрыть соединения."""
+        if self.buffer is not None:
+            await self.buffer.close()
+            logger.info(f"Очередь записи закрыта: {self.buffer.stats()}")
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def migrate(self) -> list:
+        """Применить миграции, которых ещё не было; возвращает их номера."""
+        conn = self._connect()
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                # Обычный запуск: схема актуальна, DDL не выполняется вовсе
+                return []
+            # IMMEDIATE — второй процесс, стартующий одновременно, подождёт и
+            # увидит уже новую версию. Все миграции — одной транзакцией
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            applied = []
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(conn)
+                applied.append(number)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+            if applied:
+                logger.info(f"Схема базы обновлена до версии {SCHEMA_VERSION}: миграции {applied}")
+            return applied
+        finally:
+            with self._connections_lock:
+                self._connections.remove(conn)
+            conn.close()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+# --- Отложенная запись ---
+
+class WriteBehindQueue:
+    """
+    Буфер отложенной записи: накапливает вставки и сбрасывает их одной
+    транзакцией, когда набралось max_batch строк или истёк max_delay_ms
+    с момента появления первой строки в буфере.
+    """
+
+    def __init__(self, db: Database, max_batch: int = 100, max_delay_ms: int = 50):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def put(self, fn, *args):
+        if self._closing:
+            raise RuntimeError("Очередь записи закрыта")
+        self._pending.append((fn, args))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        self._closing = True
+        self._has_items.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        while self._pending:
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    async def _run(self):
+        while not self._closing:
+            await self._has_items.wait()
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе очереди записи ({self.depth} строк): {e}")
+                await asyncio.sleep(self.max_delay)
+
+    async def flush(self):
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        if not self._pending:
+            self._has_items.clear()
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            # shield: при отмене задачи начатая транзакция всё равно доедет до диска
+            failed = await asyncio.shield(self.db.write(self._apply, batch))
+        except Exception:
+            # Транзакция откатилась целиком — возвращаем строки в начало очереди
+            self._pending[:0] = batch
+            self._has_items.set()
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+
+        self.flushes += 1
+        self.flushed_rows += len(batch) - failed
+        self.failed_rows += failed
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self._total_flush_ms += elapsed
+        logger.debug(f"Очередь записи: сброшено {len(batch)} строк за {elapsed:.1f} мс, в очереди {self.depth}")
+
+    @staticmethod
+    def _apply(conn, batch):
+        # Каждая строка в своём SAVEPOINT: битая строка не откатывает всю пачку
+        failed = 0
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        for fn, args in batch:
+            conn.execute("SAVEPOINT item")
+            try:
+                fn(conn, *args)
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK TO item")
+                failed += 1
+                logger.error(f"Строка отброшена при сбросе очереди записи: {e}")
+            conn.execute("RELEASE item")
+        return failed
+
+
+# --- Репозитории ---
+
+class TicketRepository:
+    def __init__(self, db: Database, secret: bytes):
+        self.db = db
+        self.secret = secret
+
+    @staticmethod
+    def _add(conn, code, user_id, problem, status, created_at):
+        conn.execute(
+            "INSERT INTO tickets (code, user_id, problem, status, created_at, created_ts, updated_ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (code, user_id, problem, status, created_at, moscow_epoch(created_at), int(time.time())),
+        )
+
+    def _create(self, conn, user_id, problem, status, created_at):
+        # Конфликт возможен только со старыми случайными кодами — тогда берём следующий номер
+        while True:
+            number = conn.execute(
+                "UPDATE sequences SET value = value + 1 WHERE name = 'tickets' RETURNING value"
+            ).fetchone()[0]
+            code = ticket_code(number, self.secret)
+            try:
+                self._add(conn, code, user_id, problem, status, created_at)
+            except sqlite3.IntegrityError:
+                continue
+            return code
+
+    @staticmethod
+    def _page(conn, statuses, user_id, cursor, backward, limit):
+        # Keyset-пагинация по (created_at, code): каждая выборка идёт по индексу
+        # и читает не больше limit строк, как бы далеко ни листали
+        op, order = (">", "ASC") if backward else ("<", "DESC")
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if cursor is not None:
+            where.append(f"(created_at, code) {op} (?, ?)")
+            params.extend(cursor)
+
+        def fetch(status):
+            conditions = list(where)
+            args = list(params)
+            if status is not None:
+                conditions.insert(0, "status = ?")
+                args.insert(0, status)
+            sql = "SELECT code, user_id, problem, status, created_at FROM tickets"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += f" ORDER BY created_at {order}, code {order} LIMIT ?"
+            return conn.execute(sql, (*args, limit)).fetchall()
+
+        if user_id is not None and statuses:
+            # Обращений одного пользователя мало — статус проверяем прямо в выборке
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if not statuses or user_id is not None:
+            return fetch(None)
+        # По нескольким статусам — отдельная выборка по индексу на каждый и слияние
+        merged = heapq.merge(
+            *(fetch(status) for status in statuses),
+            key=lambda row: (row[4], row[0]),
+            reverse=not backward,
+        )
+        return [row for _, row in zip(range(limit), merged)]
+
+    async def create(self, user_id: int, problem: str, status: str, created_at: str) -> str:
+        """Создать обращение с новым уникальным кодом и вернуть этот код."""
+        return await self.db.write(self._create, user_id, problem, status, created_at)
+
+    async def page(self, statuses=None, user_id=None, cursor=None, backward=False, limit: int = 10):
+        """
+        Страница обращений от новых к старым.
+
+        cursor — (created_at, code) крайней строки предыдущей страницы;
+        backward=True листает к более новым. Возвращает (rows, has_newer, has_older).
+        """
+        rows = await self.db.read(self._page, statuses, user_id, cursor, backward, limit + 1)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+            return rows, more, True
+        return rows, cursor is not None, more
+
+    # --- Жизненный цикл: new → claimed → waiting_user → closed ---
+
+    @staticmethod
+    def _transition(conn, code, from_statuses, to_status, manager_id, user_id, now):
+        # Сравнение и запись одним UPDATE: из двух одновременных переходов
+        # из одного статуса пройдёт только первый
+        sql = (
+            f"UPDATE tickets SET status = ?, manager_id = COALESCE(manager_id, ?), updated_ts = ? "
+            f"WHERE code = ? AND status IN ({', '.join('?' * len(from_statuses))})"
+        )
+        params = [to_status, manager_id, now, code, *from_statuses]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        return conn.execute(sql + " RETURNING user_id, manager_id", params).fetchone()
+
+    @staticmethod
+    def _get(conn, code):
+        return conn.execute(
+            "SELECT code, user_id, problem, status, manager_id, updated_ts FROM tickets WHERE code = ?", (code,)
+        ).fetchone()
+
+    @staticmethod
+    def _open(conn, statuses):
+        return conn.execute(
+            f"SELECT code, status, updated_ts FROM tickets WHERE status IN ({', '.join('?' * len(statuses))})",
+            statuses,
+        ).fetchall()
+
+    async def transition(self, code: str, from_statuses, to_status: str, manager_id=None, user_id=None):
+        """
+        Перевести заявку в to_status, если сейчас она в одном из from_statuses
+        (и принадлежит user_id, если он задан). manager_id записывается, только
+        если у заявки ещё нет менеджера. Возвращает (user_id, manager_id) или
+        None, если заявка не найдена или её статус уже другой.
+        """
+        return await self.db.write(
+            self._transition, code, tuple(from_statuses), to_status, manager_id, user_id, int(time.time())
+        )
+
+    async def get(self, code: str):
+        return await self.db.read(self._get, code)
+
+    async def open(self, statuses):
+        """(code, status, updated_ts) всех заявок в статусах statuses."""
+        return await self.db.read(self._open, tuple(statuses))
+
+
+class RatingRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _add(conn, user_id, rating, created_at):
+        conn.execute(
+            "INSERT INTO ratings (user_id, rating, created_at, created_ts) VALUES (?, ?, ?, ?)",
+            (user_id, rating, created_at, moscow_epoch(created_at)),
+        )
+
+    async def add(self, user_id: int, rating: int, created_at: str):
+        await self.db.write(self._add, user_id, rating, created_at)
+
+    def enqueue(self, user_id: int, rating: int, created_at: str):
+        self.db.buffer.put(self._add, user_id, rating, created_at)
+
+
+class IdeaRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _add(conn, user_id, idea, created_at):
+        conn.execute(
+            "INSERT INTO ideas (user_id, idea, created_at, created_ts) VALUES (?, ?, ?, ?)",
+            (user_id, idea, created_at, moscow_epoch(created_at)),
+        )
+
+    async def add(self, user_id: int, idea: str, created_at: str):
+        await self.db.write(self._add, user_id, idea, created_at)
+
+    def enqueue(self, user_id: int, idea: str, created_at: str):
+        self.db.buffer.put(self._add, user_id, idea, created_at)
+
+
+class ProblemFeedbackRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _add(conn, description):
+        # Один атомарный UPSERT по отпечатку; первая формулировка остаётся
+        # заголовком, все варианты копятся в problem_samples
+        fingerprint = problem_fingerprint(description)
+        conn.execute(
+            "INSERT INTO problem_feedback (fingerprint, description, count) VALUES (?, ?, 1) "
+            "ON CONFLICT(fingerprint) DO UPDATE SET count = count + 1",
+            (fingerprint, description),
+        )
+        conn.execute(
+            "INSERT INTO problem_samples (fingerprint, description, count) VALUES (?, ?, 1) "
+            "ON CONFLICT(fingerprint, description) DO UPDATE SET count = count + 1",
+            (fingerprint, description),
+        )
+
+    @staticmethod
+    def _top(conn, limit, samples):
+        top = conn.execute(
+            "SELECT fingerprint, description, count FROM problem_feedback ORDER BY count DESC LIMIT ?", (limit,)
+        ).fetchall()
+        # К каждой проблеме — самые частые формулировки, кроме заголовка
+        return [
+            (description, count, conn.execute(
+                "SELECT description, count FROM problem_samples WHERE fingerprint = ? AND description != ? "
+                "ORDER BY count DESC LIMIT ?",
+                (fingerprint, description, samples),
+            ).fetchall())
+            for fingerprint, description, count in top
+        ]
+
+    async def add(self, description: str):
+        await self.db.write(self._add, description)
+
+    def enqueue(self, description: str):
+        self.db.buffer.put(self._add, description)
+
+    async def top(self, limit: int = 5, samples: int = 2):
+        """Частые проблемы: (заголовок, число отзывов, [(другая формулировка, число), ...])."""
+        return await self.db.read(self._top, limit, samples)
+
+
+class UserRepository:
+    """
+    Пользователи с кэшем строк (language, last_interaction) перед таблицей.
+
+    Запись языка идёт сразу и обновляет кэш; отметки активности копятся в
+    памяти и сбрасываются одним UPDATE на всех через flush_touches().
+    """
+
+    def __init__(self, db: Database, cache_size: int = 50_000, cache_ttl: float = 300.0):
+        self.db = db
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._touched = {}
+
+    @staticmethod
+    def _get(conn, user_id):
+        return conn.execute(
+            "SELECT language, last_interaction FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+    @staticmethod
+    def _save_language(conn, user_id, lang, now):
+        conn.execute(
+            "INSERT INTO users (user_id, language, last_interaction) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET language = excluded.language, "
+            "last_interaction = excluded.last_interaction",
+            (user_id, lang, now),
+        )
+
+    @staticmethod
+    def _touch_many(conn, touches):
+        conn.executemany(
+            "INSERT INTO users (user_id, last_interaction) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET last_interaction = excluded.last_interaction",
+            touches,
+        )
+
+    @staticmethod
+    def _recent(conn, limit):
+        return conn.execute(
+            "SELECT user_id, language, last_interaction FROM users ORDER BY last_interaction DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    async def warm(self, limit: int = 10_000) -> int:
+        """Заранее загрузить в кэш недавно активных пользователей — им первым писать после перезапуска."""
+        rows = await self.db.read(self._recent, min(limit, self.cache.maxsize))
+        for user_id, language, last_interaction in rows:
+            self.cache.set(user_id, (language, last_interaction))
+        return len(rows)
+
+    async def get(self, user_id: int):
+        """(language, last_interaction) или None, если пользователя нет."""
+        row = self.cache.get(user_id)
+        if row is None:
+            row = await self.db.read(self._get, user_id)
+            # Отсутствие строки тоже кэшируем, чтобы не ходить в базу повторно
+            self.cache.set(user_id, row or ())
+        if user_id in self._touched and row:
+            row = (row[0], self._touched[user_id])
+        return row or None
+
+    async def language(self, user_id: int):
+        row = await self.get(user_id)
+        return row[0] if row else None
+
+    async def save_language(self, user_id: int, lang: str, now: str):
+        self.cache.pop(user_id)
+        await self.db.write(self._save_language, user_id, lang, now)
+        self.cache.set(user_id, (lang, now))
+
+    def touch(self, user_id: int, now: str):
+        self._touched[user_id] = now
+
+    async def flush_touches(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        try:
+            await asyncio.shield(self.db.write(self._touch_many, list(touched.items())))
+        except Exception:
+            for user_id, now in touched.items():
+                self._touched.setdefault(user_id, now)
+            raise
+        for user_id, now in touched.items():
+            row = self.cache.get(user_id)
+            if row:
+                self.cache.set(user_id, (row[0], now))
+            elif row is not None:
+                # Строка только что появилась — отрицательный кэш больше не верен
+                self.cache.pop(user_id)
+
+
+class StatsRepository:
+    """Готовые агрегаты для админской статистики: любой запрос читает десятки строк."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _values(conn, buckets):
+        rows = conn.execute(
+            f"SELECT metric, bucket, value FROM stats WHERE bucket IN ({', '.join('?' * len(buckets))})",
+            buckets,
+        ).fetchall()
+        return {(metric, bucket): value for metric, bucket, value in rows}
+
+    async def dashboard(self, now: datetime, days: int = 7) -> dict:
+        """
+        Итоги, последние 24 часа и последние days дней относительно now
+        (московское время). Дни идут от старых к новым.
+        """
+        hours = [(now - timedelta(hours=i)).strftime("%Y-%m-%d %H") for i in range(24)]
+        day_buckets = [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days - 1, -1, -1)]
+        values = await self.db.read(self._values, [""] + hours + day_buckets)
+
+        def total(metric, buckets):
+            return sum(values.get((metric, bucket), 0) for bucket in buckets)
+
+        metrics = ("tickets", "ratings", "rating_sum", "ideas")
+        return {
+            "total": {metric: total(metric, [""]) for metric in metrics + ("feedback",)},
+            "last_24h": {metric: total(metric, hours) for metric in metrics},
+            "last_days": {metric: total(metric, day_buckets) for metric in metrics},
+            "days": [(day, {metric: values.get((metric, day), 0) for metric in metrics}) for day in day_buckets],
+        }
+
+    async def rebuild(self):
+        await self.db.write(_rebuild_stats)
+
+
+class SearchRepository:
+    """Поиск по заявкам, идеям и отзывам о проблемах через индекс FTS5."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def _search(conn, match, limit, offset):
+        # Окно — по каждой таблице отдельно: иначе идеи с большими rowid
+        # вытеснили бы из выдачи более новые заявки
+        hits = []
+        truncated = False
+        for number in SEARCH_KINDS:
+            low = number << SEARCH_KIND_SHIFT
+            window = conn.execute(
+                "SELECT rowid, rank FROM search WHERE search MATCH ? AND rowid BETWEEN ? AND ? "
+                "ORDER BY rowid DESC LIMIT ?",
+                (match, low, low + (1 << SEARCH_KIND_SHIFT) - 1, SEARCH_WINDOW + 1),
+            ).fetchall()
+            truncated = truncated or len(window) > SEARCH_WINDOW
+            hits.extend(window[:SEARCH_WINDOW])
+        hits.sort(key=lambda hit: hit[1])
+        rows = []
+        for rowid, _ in hits[offset:offset + limit]:
+            kind, source = divmod(rowid, 1 << SEARCH_KIND_SHIFT)
+            table = SEARCH_KINDS[kind]
+            if table == "tickets":
+                row = conn.execute(
+                    "SELECT code, user_id, problem, created_at, status FROM tickets WHERE rowid = ?", (source,)
+                ).fetchone()
+            elif table == "ideas":
+                row = conn.execute(
+                    "SELECT id, user_id, idea, created_at, NULL FROM ideas WHERE id = ?", (source,)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT id, NULL, description, NULL, count FROM problem_feedback WHERE id = ?", (source,)
+                ).fetchone()
+            if row is not None:
+                rows.append((table, *row))
+        return rows, truncated
+
+    @staticmethod
+    def _rebuild(conn):
+        _rebuild_search(conn)
+
+    async def find(self, text: str, offset: int = 0, limit: int = 10):
+        """
+        Страница результатов, от более релевантных к менее (bm25) среди
+        последних SEARCH_WINDOW совпадений каждой таблицы.
+
+        Строки — (таблица, код или id, user_id, текст, created_at, статус
+        заявки или число отзывов). Возвращает (rows, has_more, truncated);
+        truncated — совпадений больше, чем попало в окна, и часть отброшена.
+        """
+        match = search_query(text)
+        if match is None:
+            return [], False, False
+        rows, truncated = await self.db.read(self._search, match, limit + 1, offset)
+        return rows[:limit], len(rows) > limit, truncated
+
+    async def rebuild(self):
+        await self.db.write(self._rebuild)
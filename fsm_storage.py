@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from db import Database
+from metrics import FSM_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в SQLite (таблица fsm_states).
+
+    Состояния переживают перезапуск и доступны нескольким процессам бота,
+    работающим с одной базой. Записи копятся в памяти и сбрасываются пачкой
+    раз в flush_interval_ms (несколько изменений одного ключа схлопываются
+    в одно), чтения обслуживаются из LRU-кэша. Брошенные диалоги удаляются
+    через state_ttl секунд бездействия.
+
+    При нескольких процессах cache_ttl задаёт, насколько долго процесс может
+    видеть чужое устаревшее состояние; 0 отключает кэш чтения.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        state_ttl: int = 7 * 24 * 3600,
+        cache_ttl: float = 2.0,
+        cache_size: int = 10_000,
+        flush_interval_ms: int = 50,
+        evict_interval: int = 600,
+    ):
+        self.db = db
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.evict_interval = evict_interval
+        # key -> (state, data, время загрузки)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # key -> (state, data) ещё не записанные в базу
+        self._dirty: Dict[str, tuple] = {}
+        self._task = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.destiny}"
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # --- Чтение ---
+
+    async def _load(self, key: str) -> tuple:
+        dirty = self._dirty.get(key)
+        if dirty is not None:
+            return dirty
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[2] < self.cache_ttl:
+            self._cache.move_to_end(key)
+            return cached[0], cached[1]
+
+        row = await self.db.read(self._select, key, time.time())
+        state, data = (row[0], json.loads(row[1])) if row else (None, {})
+        self._remember(key, state, data)
+        return state, data
+
+    @staticmethod
+    def _select(conn, key, now):
+        return conn.execute(
+            "SELECT state, data FROM fsm_states WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+
+    def _remember(self, key: str, state, data):
+        if self.cache_ttl <= 0:
+            return
+        self._cache[key] = (state, data, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return data.copy()
+
+    # --- Запись ---
+
+    async def set_state(self, bot: Bot, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        previous, data = await self._load(k)
+        state = state.state if isinstance(state, State) else state
+        if state != previous:
+            FSM_TRANSITIONS.inc(previous or "", state or "")
+        self._put(k, state, data)
+
+    async def set_data(self, bot: Bot, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self._key(key)
+        state, _ = await self._load(k)
+        self._put(k, state, data.copy())
+
+    def _put(self, key: str, state, data):
+        self._dirty[key] = (state, data)
+        self._remember(key, state, data)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        expires_at = time.time() + self.state_ttl
+        upserts = []
+        deletes = []
+        for key, (state, data) in batch.items():
+            if state is None and not data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, state, json.dumps(data, ensure_ascii=False), expires_at))
+        try:
+            await asyncio.shield(self.db.write(self._store, upserts, deletes))
+        except Exception:
+            # Не затираем более свежие изменения, сделанные во время записи
+            for key, value in batch.items():
+                self._dirty.setdefault(key, value)
+            raise
+
+    @staticmethod
+    def _store(conn, upserts, deletes):
+        conn.executemany(
+            "INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+            "expires_at = excluded.expires_at",
+            upserts,
+        )
+        conn.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+
+    # --- Фоновые задачи ---
+
+    @staticmethod
+    def _evict(conn, now):
+        return conn.execute("DELETE FROM fsm_states WHERE expires_at <= ?", (now,)).rowcount
+
+    async def _run(self):
+        next_eviction = time.monotonic() + self.evict_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() >= next_eviction:
+                    next_eviction = time.monotonic() + self.evict_interval
+                    removed = await self.db.write(self._evict, time.time())
+                    if removed:
+                        logger.info(f"Удалено брошенных FSM-состояний: {removed}")
+            except Exception as e:
+                logger.error(f"Ошибка при записи FSM-состояний: {e}")
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, Optional
+
+from cache import TTLCache
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+
+def vless_key(template: str) -> str:
+    """Новый ключ по шаблону вида «vless://{uuid}@host:443?...#LKN»."""
+    return template.format(uuid=uuid.uuid4())
+
+
+class KeyPool:
+    """
+    Выдача персональных ключей VPN из заранее сгенерированного запаса.
+
+    Ключи лежат в таблице vpn_keys; свободные — с user_id IS NULL. Выдача —
+    один UPDATE ... RETURNING в потоке-писателе: он забирает первый
+    свободный ключ и записывает владельца, так что один ключ не достанется
+    двоим, а UNIQUE(user_id) не даст одному пользователю получить два.
+    Выданный ключ кэшируется. Фоновая задача держит запас свободных ключей
+    не ниже low_water, догенерируя их пачками по batch_size; генерация идёт
+    в отдельном потоке, и выдача её не ждёт. generate() возвращает новый
+    ключ или None, если выдача ключей выключена.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        generate: Callable[[], Optional[str]],
+        low_water: int = 100,
+        batch_size: int = 500,
+        check_interval: float = 60.0,
+        cache_size: int = 50_000,
+    ):
+        self.db = db
+        self.generate = generate
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.check_interval = check_interval
+        self._cache = TTLCache(maxsize=cache_size, ttl=24 * 3600)
+        self._free = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    # --- Выдача ---
+
+    @staticmethod
+    def _assigned(conn, user_id):
+        row = conn.execute("SELECT key FROM vpn_keys WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    @staticmethod
+    def _claim(conn, user_id, now):
+        row = conn.execute("SELECT key FROM vpn_keys WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            return row[0], False
+        row = conn.execute(
+            "UPDATE vpn_keys SET user_id = ?, assigned_at = ? "
+            "WHERE id = (SELECT id FROM vpn_keys WHERE user_id IS NULL ORDER BY id LIMIT 1) AND user_id IS NULL "
+            "RETURNING key",
+            (user_id, now),
+        ).fetchone()
+        return (row[0], True) if row is not None else (None, False)
+
+    async def issue(self, user_id: int) -> Optional[str]:
+        """Ключ пользователя; при первом обращении — закрепить свободный из запаса."""
+        key = self._cache.get(user_id)
+        if key is None:
+            key = await self.db.read(self._assigned, user_id)
+        if key is not None:
+            self._cache.set(user_id, key)
+            return key
+        key, claimed = await self.db.write(self._claim, user_id, time.time())
+        if key is None:
+            # Запас пуст: генерируем ключ на месте, чтобы пользователь не остался без него
+            logger.warning("Запас ключей VPN пуст, генерируем ключ на месте")
+            if not await self._generate_batch(1):
+                return None
+            key, claimed = await self.db.write(self._claim, user_id, time.time())
+            if key is None:
+                return None
+        if claimed and self._free is not None:
+            self._free -= 1
+            if self._free < self.low_water:
+                self._wakeup.set()
+        self._cache.set(user_id, key)
+        return key
+
+    # --- Пополнение запаса ---
+
+    @staticmethod
+    def _count_free(conn):
+        return conn.execute("SELECT COUNT(*) FROM vpn_keys WHERE user_id IS NULL").fetchone()[0]
+
+    @staticmethod
+    def _insert(conn, keys, now):
+        return conn.executemany(
+            "INSERT OR IGNORE INTO vpn_keys (key, created_at) VALUES (?, ?)", [(key, now) for key in keys]
+        ).rowcount
+
+    def _make(self, count):
+        keys = []
+        for _ in range(count):
+            key = self.generate()
+            if key is None:
+                break
+            keys.append(key)
+        return keys
+
+    async def _generate_batch(self, count) -> int:
+        keys = await asyncio.get_running_loop().run_in_executor(None, self._make, count)
+        if not keys:
+            return 0
+        added = await self.db.write(self._insert, keys, time.time())
+        if self._free is not None:
+            self._free += added
+        return added
+
+    async def refill(self) -> int:
+        """Догенерировать ключи пачками, пока свободных меньше low_water."""
+        self._free = await self.db.read(self._count_free)
+        added = 0
+        while self._free < self.low_water:
+            batch = await self._generate_batch(self.batch_size)
+            if not batch:
+                break
+            added += batch
+        if added:
+            logger.info(f"Запас ключей VPN пополнен на {added}, свободно {self._free}")
+        return added
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"Ошибка пополнения запаса ключей VPN: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,139 @@
+import atexit
+import contextvars
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+# Поля, которые попадают в каждую запись лога: user_id, handler, ticket
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+CONTEXT_FIELDS = ("user_id", "handler", "ticket")
+
+
+def bind(**fields) -> contextvars.Token:
+    """Добавить поля к записям лога до конца текущего апдейта (задачи)."""
+    return _context.set({**_context.get(), **fields})
+
+
+def reset(token: contextvars.Token):
+    _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Копирует поля контекста в запись; работает в потоке, который пишет лог."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingHandler(logging.handlers.RotatingFileHandler):
+    """
+    Ротация по размеру (max_bytes) или по времени (раз в interval секунд),
+    что наступит раньше. Старые файлы сжимаются в .gz.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _compress
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+def _compress(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполненной очереди теряет запись, а не ждёт."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    filename: str = "bot.log",
+    level: int = logging.INFO,
+    json_format: bool = False,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 10,
+    rotate_interval: float = 24 * 3600,
+    queue_size: int = 100_000,
+) -> logging.handlers.QueueListener:
+    """
+    Логирование через очередь: обработчики бота только кладут запись в
+    очередь, а запись на диск, ротация и сжатие идут в отдельном потоке
+    QueueListener. Если диск не успевает и очередь заполнена, новые записи
+    отбрасываются — обработка апдейтов на диске не блокируется.
+    """
+    file_handler = SizeAndTimeRotatingHandler(filename, max_bytes, backup_count, rotate_interval)
+    if json_format:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]):
+    """Дописать очередь на диск и закрыть файл; повторный вызов ничего не делает."""
+    if listener is None or listener._thread is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+
+from db import Database, _rebuild_search
+
+logger = logging.getLogger(__name__)
+
+# Что переносится в архив: таблица -> дополнительное условие отбора
+ARCHIVE_SOURCES = {
+    "tickets": "status = 'closed'",
+    "ratings": "1",
+    "ideas": "1",
+}
+
+
+class Maintenance:
+    """
+    Периодическое обслуживание базы в фоне.
+
+    Раз в interval секунд закрытые заявки, оценки и идеи старше заданного
+    возраста (в днях, 0 — не трогать) переносятся пачками по batch_size
+    строк в таблицу archive сжатым JSON. Каждая пачка — отдельная короткая
+    транзакция в потоке-писателе, так что обработчики между пачками
+    продолжают писать. После переноса освобождается до vacuum_pages
+    страниц (incremental VACUUM), понемногу сливаются сегменты поискового
+    индекса, обновляется статистика планировщика (ANALYZE) и обрезается WAL.
+
+    Старую базу без auto_vacuum=INCREMENTAL задача один раз переводит в
+    этот режим полным VACUUM; на это время запись в базу приостанавливается.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        interval: float = 6 * 3600,
+        ticket_days: int = 90,
+        rating_days: int = 180,
+        idea_days: int = 365,
+        batch_size: int = 1000,
+        vacuum_pages: int = 2000,
+        first_run_delay: float = 60.0,
+    ):
+        self.db = db
+        self.interval = interval
+        self.ages = {"tickets": ticket_days, "ratings": rating_days, "ideas": idea_days}
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.first_run_delay = first_run_delay
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.first_run_delay)
+        while True:
+            try:
+                result = await self.run_once()
+                logger.info(f"Обслуживание базы: {result}")
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания базы: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> dict:
+        started = time.monotonic()
+        result = {}
+        for kind, condition in ARCHIVE_SOURCES.items():
+            days = self.ages[kind]
+            if not days:
+                continue
+            before = int(time.time()) - days * 86400
+            moved = 0
+            while True:
+                rows = await self.db.write(self._archive_batch, kind, condition, before, self.batch_size)
+                moved += rows
+                if rows < self.batch_size:
+                    break
+                await asyncio.sleep(0)
+            result[kind] = moved
+
+        if await self.db.read(self._auto_vacuum_mode) != 2:
+            logger.info("Обслуживание базы: перевод в auto_vacuum=INCREMENTAL (полный VACUUM)")
+            await self.db.write(self._enable_incremental_vacuum)
+        result["freed_pages"] = await self.db.write(self._compact, self.vacuum_pages)
+        result["seconds"] = round(time.monotonic() - started, 2)
+        return result
+
+    @staticmethod
+    def _archive_batch(conn, kind, condition, before, limit):
+        cursor = conn.execute(
+            f"SELECT rowid, * FROM {kind} WHERE {condition} AND created_ts < ? ORDER BY created_ts LIMIT ?",
+            (before, limit),
+        )
+        columns = [description[0] for description in cursor.description][1:]
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        created_ts = columns.index("created_ts")
+        data = zlib.compress(json.dumps([row[1:] for row in rows], ensure_ascii=False).encode("utf-8"))
+        conn.execute(
+            "INSERT INTO archive (kind, columns, data, rows, first_ts, last_ts, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, json.dumps(columns), data, len(rows), rows[0][1 + created_ts], rows[-1][1 + created_ts], time.time()),
+        )
+        conn.executemany(f"DELETE FROM {kind} WHERE rowid = ?", [(row[0],) for row in rows])
+        return len(rows)
+
+    @staticmethod
+    def _auto_vacuum_mode(conn):
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    @staticmethod
+    def _enable_incremental_vacuum(conn):
+        conn.commit()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        # Полный VACUUM может перенумеровать rowid у tickets (нет INTEGER
+        # PRIMARY KEY), а на них ссылается поисковый индекс
+        _rebuild_search(conn)
+        conn.commit()
+
+    @staticmethod
+    def _compact(conn, pages):
+        conn.commit()
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # Слияние сегментов поискового индекса понемногу: меньше сегментов —
+        # быстрее запросы, а полный optimize надолго занял бы писателя
+        conn.execute("INSERT INTO search (search, rank) VALUES ('merge', 500)")
+        # Ограничиваем выборку, чтобы ANALYZE на большой базе оставался быстрым
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return free_before - free_after
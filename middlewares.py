@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from cache import TTLCache
+from db import Database
+import logging_setup
+from metrics import HANDLER_ERRORS, HANDLER_SECONDS
+from settings import SettingsStore
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """
+    Считает апдейты, которые сейчас в обработке. При остановке drain()
+    ждёт, пока они закончатся, чтобы их записи успели попасть в базу.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.count += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.count -= 1
+            if not self.count:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Дождаться конца обработки апдейтов; False, если не успели за timeout."""
+        if self.count:
+            logger.info(f"Ожидаем завершения {self.count} обработчиков")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дождались {self.count} обработчиков за {timeout} с")
+            return False
+
+
+class LastInteractionMiddleware(BaseMiddleware):
+    """
+    Отмечает время последнего обращения пользователя на каждом апдейте.
+
+    Отметки только запоминаются в памяти и раз в flush_interval секунд
+    уходят в базу одним пакетным UPDATE.
+    """
+
+    def __init__(self, db: Database, now: Callable[[], str], flush_interval: float = 30.0):
+        self.db = db
+        self.now = now
+        self.flush_interval = flush_interval
+        self._task = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None:
+            self.db.users.touch(user.id, self.now())
+        return await handler(event, data)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.db.users.flush_touches()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.db.users.flush_touches()
+            except Exception as e:
+                logger.error(f"Ошибка при записи last_interaction: {e}")
+
+
+class LocaleMiddleware(BaseMiddleware):
+    """
+    Подставляет в обработчик готовый Locale (аргумент ui) на языке
+    пользователя из текущего снимка настроек.
+    """
+
+    def __init__(self, db: Database, settings: SettingsStore):
+        self.db = db
+        self.settings = settings
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        lang = await self.db.users.language(user.id) if user is not None else None
+        data["ui"] = self.settings.current.catalog.get(lang)
+        return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Время и исключения обработчиков по имени функции-обработчика."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Добавляет user_id и имя обработчика к записям лога, сделанным во время апдейта."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        token = logging_setup.bind(
+            user_id=user.id if user is not None else None,
+            handler=data["handler"].callback.__name__,
+        )
+        try:
+            return await handler(event, data)
+        finally:
+            logging_setup.reset(token)
+
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    """
+    Отбрасывает повторные нажатия до выбора обработчика.
+
+    Повторная доставка того же callback_query id и одинаковые нажатия одной
+    кнопки одного сообщения чаще, чем раз в coalesce_window секунд,
+    получают пустой answer() и дальше не идут — ни в базу, ни в FSM.
+    """
+
+    def __init__(self, coalesce_window: float = 1.0, maxsize: int = 50_000):
+        self._seen_ids = TTLCache(maxsize=maxsize, ttl=60.0)
+        self._recent = TTLCache(maxsize=maxsize, ttl=coalesce_window)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        if event.id in self._seen_ids:
+            return None
+        self._seen_ids.set(event.id, True)
+
+        key = (event.from_user.id, event.message.message_id if event.message else None, event.data)
+        if key in self._recent:
+            await _answer_quietly(event)
+            return None
+        self._recent.set(key, True)
+        return await handler(event, data)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты для обработчиков, помеченных флагом throttle.
+
+    limits: группа -> (rate в секунду, burst). Обработчик выбирает группу
+    флагом, например @dp.message(..., flags={"throttle": "codewords"}).
+    На каждого пользователя и группу хранится ведро токенов — кортеж
+    (токены, время) в TTLCache; запись живёт ровно столько, сколько ведро
+    заполняется до конца, так что пропавшая запись равна полному ведру.
+    Отклонённому запросу отвечаем текстом throttled на языке пользователя
+    (Locale уже подставлен LocaleMiddleware) — сообщением или в answer()
+    нажатия, но не чаще раза за время пополнения одного токена, чтобы
+    частые запросы не превращались в частые ответы. База при этом не
+    трогается.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], maxsize: int = 50_000):
+        self.limits = limits
+        self._buckets = {
+            group: TTLCache(maxsize=maxsize, ttl=burst / rate)
+            for group, (rate, burst) in limits.items()
+        }
+        # Кому уже ответили «слишком часто»: запись живёт, пока не вернётся токен
+        self._notified = {
+            group: TTLCache(maxsize=maxsize, ttl=1 / rate)
+            for group, (rate, burst) in limits.items()
+        }
+        self.rejected = 0
+
+    def allow(self, group: str, user_id: int) -> bool:
+        rate, burst = self.limits[group]
+        buckets = self._buckets[group]
+        now = time.monotonic()
+        tokens, updated = buckets.get(user_id, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            return False
+        buckets.set(user_id, (tokens - 1, now))
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        group = get_flag(data, "throttle")
+        user = data.get("event_from_user")
+        if group is None or user is None or group not in self.limits:
+            return await handler(event, data)
+        if self.allow(group, user.id):
+            return await handler(event, data)
+
+        self.rejected += 1
+        logger.debug(f"Троттлинг: {group} для пользователя {user.id}")
+        text = None
+        ui = data.get("ui")
+        notified = self._notified[group]
+        if ui is not None and notified.get(user.id) is None:
+            notified.set(user.id, True)
+            text = ui.texts["throttled"]
+        if isinstance(event, CallbackQuery):
+            await _answer_quietly(event, text)
+        elif isinstance(event, Message) and text is not None:
+            await _reply_quietly(event, text)
+        return None
+
+
+async def _answer_quietly(callback: CallbackQuery, text: Optional[str] = None):
+    # Убираем «часики» на кнопке; ошибка (например, устаревший query) не важна
+    try:
+        await callback.answer(text)
+    except Exception as e:
+        logger.debug(f"Не удалось ответить на callback {callback.id}: {e}")
+
+
+async def _reply_quietly(message: Message, text: str):
+    try:
+        await message.answer(text)
+    except Exception as e:
+        logger.debug(f"Не удалось ответить пользователю {message.chat.id}: {e}")
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Iterable, Optional
+
+from aiogram import Bot, types
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+)
+
+from cache import TTLCache
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена (0 — токен взят сразу)."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            delay = self.delay()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Опустошить ведро на seconds секунд (ответ RetryAfter от Telegram)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class Outbox:
+    """
+    Фоновая отправка сообщений с постоянной очередью в таблице outbox.
+
+    send()/send_many() только записывают сообщение в базу и кладут его в
+    ограниченную очередь в памяти — вызывающий обработчик не ждёт Telegram.
+    Несколько воркеров отправляют сообщения параллельно, соблюдая общий
+    лимит и лимит на чат. Сообщения, которые не поместились в очередь,
+    упали с ошибкой сети или не успели уйти до остановки, остаются в базе
+    и подбираются периодическим опросом, в том числе после перезапуска.
+    Доставка «хотя бы один раз»: при падении между отправкой и удалением
+    строки сообщение уйдёт повторно.
+
+    С одной базой могут работать несколько процессов, поэтому строку
+    сначала захватывают: next_attempt_at сдвигается на lease секунд вперёд,
+    и опрос других процессов её не видит, пока захват не истечёт.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        bot: Bot,
+        concurrency: int = 8,
+        queue_size: int = 1000,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_attempts: int = 8,
+        poll_interval: float = 5.0,
+        lease: float = 300.0,
+    ):
+        self.db = db
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = TTLCache(maxsize=10_000, ttl=60.0)
+        self._in_flight = set()
+        self._poller = None
+        self._workers = []
+
+    # --- Постановка в очередь ---
+
+    @staticmethod
+    def _insert(conn, rows, claimed_until):
+        # Новые строки сразу захвачены этим процессом: их отправят свои воркеры
+        ids = []
+        for chat_id, payload, now in rows:
+            cur = conn.execute(
+                "INSERT INTO outbox (chat_id, payload, attempts, next_attempt_at, created_at) VALUES (?, ?, 0, ?, ?)",
+                (chat_id, payload, claimed_until, now),
+            )
+            ids.append(cur.lastrowid)
+        return ids
+
+    async def send(self, chat_id: int, text: str, reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+                   parse_mode: Optional[str] = None):
+        await self.send_many((chat_id,), text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    async def send_many(self, chat_ids: Iterable[int], text: str,
+                        reply_markup: Optional[types.InlineKeyboardMarkup] = None,
+                        parse_mode: Optional[str] = None):
+        payload = {"text": text}
+        if reply_markup is not None:
+            payload["reply_markup"] = json.loads(reply_markup.json(exclude_none=True))
+        if parse_mode is not None:
+            payload["parse_mode"] = parse_mode
+        payload = json.dumps(payload, ensure_ascii=False)
+        chat_ids = list(chat_ids)
+        now = time.time()
+        ids = await self.db.write(
+            self._insert, [(chat_id, payload, now) for chat_id in chat_ids], now + self.lease
+        )
+        rejected = [
+            message_id for message_id, chat_id in zip(ids, chat_ids)
+            if not self._offer((message_id, chat_id, payload, 0))
+        ]
+        if rejected:
+            # Очередь полна — отпускаем захват, опрос любого процесса заберёт их
+            await self.db.write(self._release, rejected, now)
+
+    def _offer(self, item) -> bool:
+        if item[0] in self._in_flight:
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Останется в базе, опрос заберёт позже
+            return False
+        self._in_flight.add(item[0])
+        return True
+
+    # --- Жизненный цикл ---
+
+    def start(self):
+        if self._poller is not None:
+            return
+        self._poller = asyncio.create_task(self._poll())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self, drain_timeout: float = 5.0):
+        """Дождаться отправки очереди (не дольше drain_timeout) и остановить воркеров."""
+        if self._poller is None:
+            return
+        self._poller.cancel()
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox: не отправлено {self._queue.qsize()} сообщений, останутся в базе")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(self._poller, *self._workers, return_exceptions=True)
+        if self._in_flight:
+            # Неотправленные отпускаем сразу, а не по истечении захвата
+            await self.db.write(self._release, list(self._in_flight), time.time())
+            self._in_flight.clear()
+        self._poller = None
+        self._workers = []
+
+    # --- Отправка ---
+
+    @staticmethod
+    def _claim(conn, now, claimed_until, limit):
+        # Выбор и захват — одним UPDATE в потоке-писателе: два процесса не
+        # получат одну и ту же строку
+        return conn.execute(
+            "UPDATE outbox SET next_attempt_at = ? WHERE id IN ("
+            "SELECT id FROM outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT ?"
+            ") RETURNING id, chat_id, payload, attempts",
+            (claimed_until, now, limit),
+        ).fetchall()
+
+    @staticmethod
+    def _release(conn, message_ids, now):
+        conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", [(now, i) for i in message_ids])
+
+    @staticmethod
+    def _delete(conn, message_id):
+        conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    @staticmethod
+    def _reschedule(conn, message_id, attempts, next_attempt_at):
+        conn.execute(
+            "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, next_attempt_at, message_id),
+        )
+
+    async def _poll(self):
+        while True:
+            try:
+                free = self._queue.maxsize - self._queue.qsize()
+                if free > 0:
+                    now = time.time()
+                    rows = await self.db.write(self._claim, now, now + self.lease, free)
+                    rejected = [row[0] for row in rows if not self._offer(tuple(row))]
+                    if rejected:
+                        await self.db.write(self._release, rejected, now)
+            except Exception as e:
+                logger.error(f"Outbox: ошибка опроса очереди: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _done(self, message_id):
+        # Удаляем сразу, а не через буфер записи: пока строка в базе, опрос
+        # может взять её повторно
+        await self.db.write(self._delete, message_id)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(*item)
+            except Exception as e:
+                logger.error(f"Outbox: ошибка обработки сообщения {item[0]}: {e}")
+            finally:
+                self._in_flight.discard(item[0])
+                self._queue.task_done()
+
+    async def _deliver(self, message_id, chat_id, payload, attempts):
+        kwargs = json.loads(payload)
+        if "reply_markup" in kwargs:
+            kwargs["reply_markup"] = types.InlineKeyboardMarkup(**kwargs["reply_markup"])
+        chat_bucket = self._chat_bucket(chat_id)
+
+        while True:
+            await chat_bucket.acquire()
+            await self._global.acquire()
+            try:
+                await self.bot.send_message(chat_id, **kwargs)
+            except TelegramRetryAfter as e:
+                # Telegram сам говорит, сколько ждать; тормозим и этот чат, и всех
+                chat_bucket.pause(e.retry_after)
+                self._global.pause(e.retry_after)
+                logger.warning(f"Outbox: RetryAfter {e.retry_after} с для чата {chat_id}")
+                # Продлеваем захват на время паузы, чтобы строку не взял другой процесс
+                await self.db.write(
+                    self._reschedule, message_id, attempts, time.time() + e.retry_after + self.lease
+                )
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound) as e:
+                logger.error(f"Outbox: сообщение {message_id} для {chat_id} отброшено: {e}")
+                await self._done(message_id)
+                return
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"Outbox: сообщение {message_id} для {chat_id} отброшено после {attempts} попыток: {e}")
+                    await self._done(message_id)
+                    return
+                delay = min(300, 2 ** attempts)
+                logger.warning(f"Outbox: ошибка отправки {chat_id} ({e}), повтор через {delay} с")
+                await self.db.write(self._reschedule, message_id, attempts, time.time() + delay)
+                return
+            await self._done(message_id)
+            return
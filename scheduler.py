@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Таймеры на одной куче и одной задаче.
+
+    schedule(key, due, payload) ставит или переставляет таймер для key
+    (due — время Unix); cancel(key) снимает его. Когда время подходит,
+    вызывается callback(key, payload). Переставленные и снятые таймеры не
+    удаляются из кучи, а пропускаются при извлечении, поэтому обе операции
+    стоят O(log n), а тысячи таймеров — одну спящую задачу.
+    """
+
+    def __init__(self, callback: Callable[[Hashable, Any], Awaitable[None]]):
+        self.callback = callback
+        self._heap = []
+        # key -> (due, номер записи в куче, payload) для действующего таймера
+        self._timers: Dict[Hashable, tuple] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, key: Hashable, due: float, payload: Any = None):
+        seq = next(self._counter)
+        self._timers[key] = (due, seq, payload)
+        heapq.heappush(self._heap, (due, seq, key))
+        if self._heap[0][1] == seq:
+            # Новый таймер раньше всех — будим цикл, чтобы он пересчитал сон
+            self._wakeup.set()
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._compact()
+
+    def cancel(self, key: Hashable):
+        self._timers.pop(key, None)
+
+    def _compact(self):
+        self._heap = [(due, seq, key) for key, (due, seq, _) in self._timers.items()]
+        heapq.heapify(self._heap)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, key = heapq.heappop(self._heap)
+                timer = self._timers.get(key)
+                if timer is None or timer[1] != seq:
+                    continue
+                del self._timers[key]
+                try:
+                    await self.callback(key, timer[2])
+                except Exception as e:
+                    logger.error(f"Ошибка таймера {key}: {e}")
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
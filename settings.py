@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+from types import MappingProxyType
+from typing import FrozenSet, NamedTuple, Optional, Tuple
+
+from catalog import COUNTRIES, DEFAULT_LANGUAGE, DEVICES, KEY_PLACEHOLDER, LANGUAGES, SERVERS, TEXTS, Catalog
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию, если в файле настроек нет соответствующего ключа
+DEFAULTS = {
+    "managers": [5546292835, 1789838272],
+    "codewords": ["Симфония", "Людвиг Ван Бетховен"],
+    "languages": LANGUAGES,
+    "devices": list(DEVICES),
+    "servers": list(SERVERS),
+    "countries": list(COUNTRIES),
+    # Пары [сервер, страна], для которых вместо рекомендаций показывается
+    # ukraine_warning: операторы страны блокируют IP серверов
+    "blocked_routes": [["Russia", "Украина"]],
+    "key_text": KEY_PLACEHOLDER,
+    # Шаблон персонального ключа с {uuid}; null — всем показывается key_text
+    "key_template": None,
+    "texts": {},
+}
+CALLBACK_DATA_LIMIT = 64
+# Тексты, которые бот форматирует при отправке, и их подстановки
+TEXT_FIELDS = {
+    "ticket_accepted": ("code",),
+    "ticket_closed": ("code",),
+    "ticket_reply": ("code", "text"),
+    "ticket_reply_prompt": ("code",),
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class Settings(NamedTuple):
+    """Неизменяемый снимок настроек и собранного по ним каталога."""
+
+    managers: FrozenSet[int]
+    codewords: Tuple[str, str]
+    catalog: Catalog
+    blocked_routes: FrozenSet[Tuple[str, str]]
+    key_template: Optional[str]
+    source: str
+
+
+# --- Проверка ---
+
+def _string_list(raw, name, prefix="") -> Tuple[str, ...]:
+    if not isinstance(raw, list) or not raw or not all(isinstance(x, str) and x.strip() for x in raw):
+        raise ConfigError(f"{name}: нужен непустой список непустых строк")
+    if len(set(raw)) != len(raw):
+        raise ConfigError(f"{name}: значения повторяются")
+    for value in raw:
+        # Обработчики отделяют значение от префикса callback_data по «_»
+        if "_" in value:
+            raise ConfigError(f"{name}: «{value}» содержит «_»")
+        if len(f"{prefix}{value}".encode("utf-8")) > CALLBACK_DATA_LIMIT:
+            raise ConfigError(f"{name}: «{value}» не помещается в callback_data")
+    return tuple(raw)
+
+
+def parse_settings(raw: dict, source: str = "<defaults>") -> Settings:
+    """Проверить содержимое файла настроек и собрать по нему снимок."""
+    if not isinstance(raw, dict):
+        raise ConfigError("Корень файла настроек должен быть объектом")
+    unknown = set(raw) - set(DEFAULTS)
+    if unknown:
+        raise ConfigError(f"Неизвестные ключи: {', '.join(sorted(unknown))}")
+    raw = {**DEFAULTS, **raw}
+
+    managers = raw["managers"]
+    if not isinstance(managers, list) or not managers or not all(
+        isinstance(x, int) and not isinstance(x, bool) for x in managers
+    ):
+        raise ConfigError("managers: нужен непустой список числовых ID")
+
+    codewords = raw["codewords"]
+    if not isinstance(codewords, list) or len(codewords) != 2 or not all(
+        isinstance(x, str) and x.strip() for x in codewords
+    ):
+        raise ConfigError("codewords: нужны ровно два непустых кодовых слова")
+
+    languages = raw["languages"]
+    if not isinstance(languages, dict) or DEFAULT_LANGUAGE not in languages or not all(
+        isinstance(name, str) and name for name in languages.values()
+    ):
+        raise ConfigError(f"languages: нужен объект «код: название», в нём обязателен {DEFAULT_LANGUAGE}")
+    for code in languages:
+        if len(f"lang_{code}".encode("utf-8")) > CALLBACK_DATA_LIMIT or "_" in code:
+            raise ConfigError(f"languages: недопустимый код языка «{code}»")
+
+    devices = _string_list(raw["devices"], "devices", "device_")
+    servers = _string_list(raw["servers"], "servers", "server_")
+    countries = _string_list(raw["countries"], "countries", "country_")
+    blocked_routes = raw["blocked_routes"]
+    if not isinstance(blocked_routes, list) or not all(
+        isinstance(pair, list) and len(pair) == 2 and pair[0] in servers and pair[1] in countries
+        for pair in blocked_routes
+    ):
+        raise ConfigError("blocked_routes: нужен список пар [сервер, страна] из servers и countries")
+    if not isinstance(raw["key_text"], str):
+        raise ConfigError("key_text: нужна строка")
+    key_template = raw["key_template"]
+    if key_template is not None:
+        if not isinstance(key_template, str) or "{uuid}" not in key_template:
+            raise ConfigError("key_template: нужна строка с {uuid} или null")
+        try:
+            key_template.format(uuid="")
+        except (KeyError, IndexError, ValueError) as e:
+            raise ConfigError(f"key_template: {e!r}") from e
+
+    # Тексты из файла дополняют и переопределяют встроенные
+    overrides = raw["texts"]
+    if not isinstance(overrides, dict) or not all(isinstance(v, dict) for v in overrides.values()):
+        raise ConfigError("texts: нужен объект «язык: {ключ: текст}»")
+    texts = {}
+    for code in set(TEXTS) | set(overrides) | set(languages):
+        base = TEXTS.get(code, TEXTS[DEFAULT_LANGUAGE])
+        merged = {**base}
+        for key, value in overrides.get(code, {}).items():
+            # Списки (countries, farewells) остаются списками, остальное — строки
+            if isinstance(base.get(key, TEXTS[DEFAULT_LANGUAGE].get(key)), tuple):
+                if not isinstance(value, list) or not all(isinstance(x, str) for x in value):
+                    raise ConfigError(f"texts.{code}.{key}: нужен список строк")
+                value = tuple(value)
+            elif not isinstance(value, str):
+                raise ConfigError(f"texts.{code}.{key}: нужна строка")
+            merged[key] = value
+        texts[code] = merged
+
+    for code, t in texts.items():
+        # Ошибку в подстановках ловим здесь, а не в обработчике после записи заявки
+        for key, fields in TEXT_FIELDS.items():
+            try:
+                t[key].format(**{field: "X" for field in fields})
+            except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+                raise ConfigError(
+                    f"texts.{code}.{key}: ошибка в подстановках ({e!r}), доступны {', '.join(fields)}"
+                ) from e
+
+    for code in languages:
+        t = texts[code]
+        required = [f"instruction_{device}" for device in devices] + [f"server_{server}" for server in servers]
+        missing = [key for key in required if not isinstance(t.get(key), str)]
+        if missing:
+            raise ConfigError(f"texts.{code}: нет текстов {', '.join(missing)}")
+        if len(t.get("countries", ())) != len(countries):
+            raise ConfigError(f"texts.{code}.countries: нужно {len(countries)} названий, как в countries")
+        if not t.get("farewells"):
+            raise ConfigError(f"texts.{code}.farewells: нужна хотя бы одна фраза")
+
+    try:
+        catalog = Catalog(
+            key_text=raw["key_text"],
+            languages=languages,
+            devices=devices,
+            servers=servers,
+            countries=countries,
+            texts=MappingProxyType(texts),
+        )
+    except (KeyError, IndexError, ValueError, TypeError) as e:
+        raise ConfigError(f"Ошибка в текстах: {e!r}") from e
+
+    return Settings(
+        managers=frozenset(managers),
+        codewords=(codewords[0], codewords[1]),
+        catalog=catalog,
+        blocked_routes=frozenset((server, country) for server, country in blocked_routes),
+        key_template=key_template,
+        source=source,
+    )
+
+
+def load_settings(path: Optional[str]) -> Settings:
+    """Прочитать файл настроек; если его нет — настройки по умолчанию."""
+    if not path or not os.path.exists(path):
+        return parse_settings({})
+    with open(path, encoding="utf-8") as f:
+        try:
+            raw = json.load(f)
+        except ValueError as e:
+            raise ConfigError(f"{path}: некорректный JSON: {e}") from e
+    return parse_settings(raw, source=path)
+
+
+# --- Горячая перезагрузка ---
+
+class SettingsStore:
+    """
+    Текущий снимок настроек в атрибуте current.
+
+    Обработчики читают store.current без блокировок: снимок неизменяем,
+    а замена — одно присваивание атрибута. Файл перечитывается при
+    изменении (проверка раз в poll_interval секунд) и по SIGHUP. Если
+    новый файл не прошёл проверку, остаётся прежний снимок.
+    """
+
+    def __init__(self, path: Optional[str], poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.current = load_settings(path)
+        self._stamp = self._file_stamp()
+        self._task = None
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def reload(self) -> bool:
+        self._stamp = self._file_stamp()
+        try:
+            # Разбор и сборка каталога — в потоке, чтобы не задерживать апдейты
+            settings = await asyncio.get_running_loop().run_in_executor(None, load_settings, self.path)
+        except (OSError, ConfigError) as e:
+            logger.error(f"Настройки не перечитаны, остаются прежние: {e}")
+            return False
+        self.current = settings
+        logger.info(f"Настройки перечитаны из {settings.source}")
+        return True
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGHUP, lambda: asyncio.create_task(self.reload())
+            )
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # Нет SIGHUP (Windows) или цикл не в главном потоке — остаётся опрос файла
+            pass
+
+    async def close(self):
+        if self._task is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._file_stamp() != self._stamp:
+                await self.reload()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from aiogram.methods import SendDocument, SendMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Beethoven  # noqa: E402
+
+MANAGER_ID = 7
+
+
+class FakeSession:
+    """Отвечает на запросы к Bot API без сети и запоминает их."""
+
+    def __init__(self):
+        self.requests = []
+        self.delay = 0.0
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.requests.append(method)
+        if isinstance(method, (SendMessage, SendDocument)):
+            return method.__returning__(
+                message_id=1, date=0, chat={"id": method.chat_id, "type": "private"}, text="..."
+            )
+        return True
+
+    def texts(self, chat_id=None):
+        return [
+            m.text for m in self.requests
+            if isinstance(m, SendMessage) and (chat_id is None or m.chat_id == chat_id)
+        ]
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Собрать приложение с базой и настройками во временном каталоге."""
+
+    def make(**settings):
+        bot_config = tmp_path / "bot_config.json"
+        bot_config.write_text(json.dumps({"managers": [MANAGER_ID], **settings}), encoding="utf-8")
+        app = Beethoven.create_app(Beethoven.Config(
+            bot_token="42:TEST",
+            db_path=str(tmp_path / "bot.db"),
+            bot_config=str(bot_config),
+            metrics_port=0,
+        ))
+        app.session = FakeSession()
+        app.bot.session.make_request = app.session.make_request
+        return app
+
+    return make
+
+
+async def started(app):
+    await app.dp.emit_startup(dispatcher=app.dp, bot=app.bot, bots=(app.bot,))
+
+
+async def stopped(app):
+    await app.dp.emit_shutdown(dispatcher=app.dp, bot=app.bot, bots=(app.bot,))
+    await app.bot.session.close()
+
+
+def sender(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": "Test"}
+
+
+def message(update_id, user_id, text):
+    chat = {"id": user_id, "type": "private"}
+    body = {"message_id": update_id, "date": 0, "chat": chat, "from": sender(user_id), "text": text}
+    if text.startswith("/"):
+        body["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": body}
+
+
+def callback(update_id, user_id, data):
+    chat = {"id": user_id, "type": "private"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": sender(user_id),
+            "data": data,
+            "message": {"message_id": update_id, "date": 0, "chat": chat, "text": "..."},
+        },
+    }
+
+
+def run(coro):
+    return asyncio.run(coro)
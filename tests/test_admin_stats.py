@@ -0,0 +1,35 @@
+from conftest import MANAGER_ID, Beethoven, callback, run, started, stopped
+
+
+def test_admin_stats_dashboard(make_app):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        now = Beethoven.now_moscow()
+        await app.db.tickets.create(1, "Не работает", "new", now)
+        await app.db.tickets.create(2, "Медленно", "new", now)
+        await app.db.ratings.add(1, 4, now)
+        for description in ("VPN не работает", "vpn  НЕ работает!", "VPN не работает"):
+            await app.db.problems.add(description)
+        await app.dp.feed_raw_update(app.bot, callback(1, MANAGER_ID, "admin_stats"))
+        await stopped(app)
+
+    run(scenario())
+    [text] = [t for t in app.session.texts(MANAGER_ID) if t.startswith("📊")]
+    assert "Общее количество заявок: 2" in text
+    assert "За 24 часа: заявок 2, оценок 1 (средняя 4.0)" in text
+    assert "- VPN не работает (3 раз)\n  также: «vpn  НЕ работает!» (1)" in text
+    assert "Очередь записи:" in text
+
+
+def test_admin_stats_denied_for_users(make_app):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        await app.dp.feed_raw_update(app.bot, callback(1, 100, "admin_stats"))
+        await stopped(app)
+
+    run(scenario())
+    assert not any(t.startswith("📊") for t in app.session.texts())
@@ -0,0 +1,53 @@
+import asyncio
+import sqlite3
+
+from conftest import Beethoven, message, run, started, stopped
+from db import SCHEMA_VERSION, Database
+
+
+def test_create_app_has_no_side_effects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("BOT_TOKEN", raising=False)
+    Beethoven.create_app(Beethoven.Config(bot_token="42:TEST", metrics_port=0))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_restart_on_the_same_database(make_app, tmp_path):
+    for update_id in (1, 2):
+        app = make_app()
+
+        async def scenario():
+            await started(app)
+            await app.dp.feed_raw_update(app.bot, message(update_id, 100, "/start"))
+            await stopped(app)
+
+        run(scenario())
+        assert app.session.texts(100)
+
+    conn = sqlite3.connect(tmp_path / "bot.db")
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+    assert Database(str(tmp_path / "bot.db")).migrate() == []
+
+
+def test_shutdown_waits_for_handlers(make_app, tmp_path):
+    app = make_app()
+    app.session.delay = 0.3
+
+    async def scenario():
+        await started(app)
+        updates = [
+            asyncio.create_task(app.dp.feed_raw_update(app.bot, message(i, 100 + i, "/start")))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0.05)
+        assert app.in_flight.count == 5
+        await stopped(app)
+        assert all(update.done() for update in updates)
+
+    run(scenario())
+    conn = sqlite3.connect(tmp_path / "bot.db")
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 5
+    # Состояние FSM после /start записано в базу уже после сброса хранилища диспетчером
+    assert conn.execute("SELECT COUNT(*) FROM fsm_states WHERE state IS NOT NULL").fetchone()[0] == 5
+    conn.close()
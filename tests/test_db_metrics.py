@@ -0,0 +1,18 @@
+import asyncio
+
+import metrics
+from db import Database
+
+
+def test_db_latency_is_labelled_per_repository(tmp_path):
+    db = Database(str(tmp_path / "bot.db"))
+    db.migrate()
+
+    async def scenario():
+        await db.tickets.get("NOPE")
+        await db.users.get(1)
+        await db.aclose()
+
+    asyncio.run(scenario())
+    operations = {labels[1] for labels in metrics.DB_SECONDS._series if labels[0] == "read"}
+    assert {"TicketRepository._get", "UserRepository._get"} <= operations
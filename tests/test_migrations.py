@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+
+from db import SCHEMA_VERSION, Database
+
+# Схема базы до появления db.py — так её создавал первый Beethoven.py
+BASELINE_SCHEMA = """
+CREATE TABLE tickets (code TEXT PRIMARY KEY, user_id INTEGER, problem TEXT, status TEXT, created_at TEXT);
+CREATE TABLE problem_feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT UNIQUE, count INTEGER DEFAULT 1);
+CREATE TABLE ideas (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, idea TEXT, created_at TEXT);
+CREATE TABLE ratings (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, rating INTEGER, created_at TEXT);
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, language TEXT DEFAULT 'ru', last_interaction TEXT);
+"""
+
+
+def baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO problem_feedback (description, count) VALUES (?, ?)",
+        [("VPN не работает", 3), ("vpn  НЕ работает!", 2), ("Медленно", 1)],
+    )
+    conn.execute("INSERT INTO tickets VALUES ('AB12CD', 100, 'Не подключается ёлка', 'Новая', '2024-05-01 10:00:00')")
+    conn.execute("INSERT INTO ideas (user_id, idea, created_at) VALUES (100, 'Добавить страну', '2024-05-02 10:00:00')")
+    conn.execute("INSERT INTO ratings (user_id, rating, created_at) VALUES (100, 5, '2024-05-03 10:00:00')")
+    conn.execute("INSERT INTO users VALUES (100, 'en', '2024-05-03 10:00:00')")
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    path = str(tmp_path / "lknvpn_bot.db")
+    baseline_db(path)
+    db = Database(path)
+    assert db.migrate() == list(range(1, SCHEMA_VERSION + 1))
+    assert db.migrate() == []
+
+    async def check():
+        try:
+            return (
+                await db.problems.top(5),
+                await db.search.find("работает"),
+                await db.search.find("елка"),
+                await db.search.find("страну"),
+                await db.users.language(100),
+            )
+        finally:
+            await db.aclose()
+
+    problems, feedback, tickets, ideas, language = asyncio.run(check())
+    assert [(description, count) for description, count, _ in problems] == [("VPN не работает", 5), ("Медленно", 1)]
+    assert problems[0][2] == [("vpn  НЕ работает!", 2)]
+    assert [row[0] for row in feedback[0]] == ["problem_feedback"]
+    assert [row[1] for row in tickets[0]] == ["AB12CD"]
+    assert [row[0] for row in ideas[0]] == ["ideas"]
+    assert language == "en"
+
+    conn = sqlite3.connect(path)
+    # integrity-check бросает DatabaseError, если индекс FTS испорчен
+    conn.execute("INSERT INTO search (search) VALUES ('integrity-check')")
+    assert conn.execute("SELECT value FROM stats WHERE metric = 'feedback' AND bucket = ''").fetchone() == (6,)
+    conn.close()
@@ -0,0 +1,48 @@
+import sqlite3
+
+from conftest import MANAGER_ID, Beethoven, message, run, started, stopped
+
+
+def test_rebuild_stats_restores_totals(make_app, tmp_path):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        now = Beethoven.now_moscow()
+        await app.db.tickets.create(1, "Не работает", "new", now)
+        await app.db.ratings.add(1, 5, now)
+        # Таблица разошлась с данными — например, после ручной правки
+        await app.db.write(lambda conn: conn.execute("DELETE FROM stats"))
+        await app.dp.feed_raw_update(app.bot, message(1, 100, "/rebuild stats"))
+        await app.dp.feed_raw_update(app.bot, message(2, MANAGER_ID, "/rebuild"))
+        await app.dp.feed_raw_update(app.bot, message(3, MANAGER_ID, "/rebuild stats"))
+        await stopped(app)
+
+    run(scenario())
+    usage, done = app.session.texts(MANAGER_ID)
+    assert usage.startswith("Использование: /rebuild")
+    assert done.startswith("stats: пересчитано")
+    assert app.session.texts(100) == [app.settings.current.catalog.get("ru").texts["access_denied"]]
+    conn = sqlite3.connect(tmp_path / "bot.db")
+    totals = dict(conn.execute("SELECT metric, value FROM stats WHERE bucket = ''"))
+    conn.close()
+    assert totals["tickets"] == 1 and totals["ratings"] == 1 and totals["rating_sum"] == 5
+
+
+def test_rebuild_search_restores_index(make_app):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        await app.db.ideas.add(1, "Добавьте Японию", Beethoven.now_moscow())
+        await app.db.write(lambda conn: conn.execute("INSERT INTO search (search) VALUES ('delete-all')"))
+        before = await app.db.search.find("японию")
+        await app.dp.feed_raw_update(app.bot, message(1, MANAGER_ID, "/rebuild search"))
+        after = await app.db.search.find("японию")
+        await stopped(app)
+        return before, after
+
+    (before, _, _), (after, _, _) = run(scenario())
+    assert before == []
+    assert [row[3] for row in after] == ["Добавьте Японию"]
+    assert app.session.texts(MANAGER_ID)[0].startswith("search: пересчитано")
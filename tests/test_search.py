@@ -0,0 +1,51 @@
+import asyncio
+
+from conftest import MANAGER_ID, message, run, started, stopped
+from db import SEARCH_WINDOW, Database
+
+NOW = "2025-01-01 10:00:00"
+
+
+def fill(conn, ideas, tickets):
+    conn.executemany(
+        "INSERT INTO ideas (user_id, idea, created_at) VALUES (?, ?, ?)",
+        [(i, f"впн идея {i}", NOW) for i in range(ideas)],
+    )
+    conn.executemany(
+        "INSERT INTO tickets (code, user_id, problem, status, created_at) VALUES (?, ?, ?, 'new', ?)",
+        [(f"T{i:05d}", i, f"впн заявка {i}", NOW) for i in range(tickets)],
+    )
+
+
+def test_window_is_taken_per_table(tmp_path):
+    db = Database(str(tmp_path / "bot.db"))
+    db.migrate()
+
+    async def scenario():
+        await db.write(fill, 1500, 5)
+        try:
+            return await db.search.find("впн", limit=3 * SEARCH_WINDOW)
+        finally:
+            await db.aclose()
+
+    rows, has_more, truncated = asyncio.run(scenario())
+    assert sorted(row[1] for row in rows if row[0] == "tickets") == [f"T{i:05d}" for i in range(5)]
+    assert sum(row[0] == "ideas" for row in rows) == SEARCH_WINDOW
+    assert not has_more
+    assert truncated
+
+
+def test_search_reports_cut_off_results(make_app):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        await app.db.write(fill, SEARCH_WINDOW + 1, 0)
+        await app.dp.feed_raw_update(app.bot, message(1, MANAGER_ID, "/search впн"))
+        await app.dp.feed_raw_update(app.bot, message(2, MANAGER_ID, "/search заявка"))
+        await stopped(app)
+
+    run(scenario())
+    many, none = app.session.texts(MANAGER_ID)
+    assert "Совпадений слишком много" in many
+    assert none == "Ничего не найдено."
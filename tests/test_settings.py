@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import Beethoven, callback, run, started, stopped
+from settings import ConfigError, SettingsStore, parse_settings
+
+
+@pytest.mark.parametrize("key, text", [
+    ("ticket_accepted", "Заявка {id}"),
+    ("ticket_closed", "Заявка {"),
+    ("ticket_reply", "{code}: {txt}"),
+    ("ticket_reply_prompt", "Ответ на {text}"),
+])
+def test_text_placeholders_are_checked(key, text):
+    with pytest.raises(ConfigError, match=f"texts.ru.{key}"):
+        parse_settings({"texts": {"ru": {key: text}}})
+
+
+def test_valid_text_override():
+    settings = parse_settings({"texts": {"en": {"ticket_reply": "#{code}\n{text}"}}})
+    assert settings.catalog.get("en").texts["ticket_reply"].format(code="A1", text="hi") == "#A1\nhi"
+
+
+def test_reload_keeps_previous_settings_on_bad_texts(tmp_path):
+    path = tmp_path / "bot_config.json"
+    path.write_text(json.dumps({"managers": [7]}), encoding="utf-8")
+    store = SettingsStore(str(path))
+    path.write_text(json.dumps({"managers": [8], "texts": {"ru": {"ticket_accepted": "{id}"}}}), encoding="utf-8")
+    assert asyncio.run(store.reload()) is False
+    assert store.current.managers == {7}
+
+
+@pytest.mark.parametrize("key, values", [
+    ("devices", ["Android", "Mac_OS"]),
+    ("servers", ["Russia_2", "Netherlands"]),
+    ("countries", ["Украина", "Другая_страна"]),
+])
+def test_underscore_in_callback_values_is_rejected(key, values):
+    with pytest.raises(ConfigError, match=key):
+        parse_settings({key: values})
+
+
+def test_blocked_routes_must_name_known_server_and_country():
+    with pytest.raises(ConfigError, match="blocked_routes"):
+        parse_settings({"blocked_routes": [["Germany", "Украина"]]})
+    assert parse_settings({"blocked_routes": []}).blocked_routes == frozenset()
+
+
+def test_country_warning_follows_settings(make_app):
+    app = make_app(blocked_routes=[["Netherlands", "США"]])
+    ui = app.settings.current.catalog.get("ru")
+
+    async def choose(update_id, server, country):
+        state = app.dp.fsm.get_context(app.bot, chat_id=100, user_id=100)
+        await state.set_state(Beethoven.Form.waiting_for_country)
+        await state.update_data(chosen_server=server)
+        await app.dp.feed_raw_update(app.bot, callback(update_id, 100, f"country_{country}"))
+
+    async def scenario():
+        await started(app)
+        await choose(1, "Netherlands", "США")
+        await choose(2, "Russia", "Украина")
+        await stopped(app)
+
+    run(scenario())
+    assert app.session.texts(100) == [ui.texts["ukraine_warning"], ui.texts["recommendations"]]
@@ -0,0 +1,43 @@
+from aiogram.methods import AnswerCallbackQuery
+
+from conftest import Beethoven, callback, message, run, started, stopped
+
+USER_ID = 100
+
+
+def test_throttled_messages_get_one_notice(make_app):
+    app = make_app()
+    throttled = app.settings.current.catalog.get("ru").texts["throttled"]
+
+    async def scenario():
+        await started(app)
+        await app.dp.feed_raw_update(app.bot, message(1, USER_ID, "/start"))
+        for update_id in range(2, 9):
+            await app.dp.feed_raw_update(app.bot, message(update_id, USER_ID, "неверно"))
+        await stopped(app)
+
+    run(scenario())
+    _, burst = Beethoven.THROTTLE_LIMITS["codewords"]
+    texts = app.session.texts(USER_ID)
+    assert texts.count(throttled) == 1
+    assert len(texts) == 1 + burst + 1
+    assert app.throttling.rejected == 7 - burst
+
+
+def test_throttled_callbacks_are_answered_with_notice(make_app):
+    app = make_app()
+    throttled = app.settings.current.catalog.get("ru").texts["throttled"]
+
+    async def scenario():
+        await started(app)
+        state = app.dp.fsm.get_context(app.bot, chat_id=USER_ID, user_id=USER_ID)
+        for update_id in range(1, 6):
+            await state.set_state(Beethoven.Form.waiting_for_rating)
+            await app.dp.feed_raw_update(app.bot, callback(update_id, USER_ID, "rating_5"))
+        await stopped(app)
+
+    run(scenario())
+    _, burst = Beethoven.THROTTLE_LIMITS["ratings"]
+    answers = [m.text for m in app.session.requests if isinstance(m, AnswerCallbackQuery)]
+    assert len(answers) == 5
+    assert answers[burst:] == [throttled, None, None]
@@ -0,0 +1,32 @@
+from conftest import MANAGER_ID, Beethoven, callback, message, run, started, stopped
+
+USER_ID = 100
+
+
+def test_user_can_reply_again_while_ticket_is_open(make_app):
+    app = make_app()
+
+    async def scenario():
+        await started(app)
+        code = await app.db.tickets.create(USER_ID, "Не работает", "new", Beethoven.now_moscow())
+        await app.db.tickets.transition(code, ("new",), "waiting_user", MANAGER_ID)
+        update_id = 0
+        for text in ("Первый ответ", "Второй ответ"):
+            await app.dp.feed_raw_update(app.bot, callback(update_id := update_id + 1, USER_ID, f"tu:{code}"))
+            await app.dp.feed_raw_update(app.bot, message(update_id := update_id + 1, USER_ID, text))
+        status = (await app.db.tickets.get(code))[3]
+        await app.db.tickets.transition(code, ("claimed",), "closed", MANAGER_ID)
+        await app.dp.feed_raw_update(app.bot, callback(update_id := update_id + 1, USER_ID, f"tu:{code}"))
+        await app.dp.feed_raw_update(app.bot, message(update_id + 1, USER_ID, "Третий ответ"))
+        await stopped(app)
+        return code, status
+
+    code, status = run(scenario())
+    assert status == "claimed"
+    forwarded = app.session.texts(MANAGER_ID)
+    assert any("Первый ответ" in t for t in forwarded)
+    assert any("Второй ответ" in t for t in forwarded)
+    assert not any("Третий ответ" in t for t in forwarded)
+    replies = app.session.texts(USER_ID)
+    assert replies.count("Ответ передан менеджеру.") == 2
+    assert sum(t.startswith(f"Заявка {code} закрыта") for t in replies) == 1
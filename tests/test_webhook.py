@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from conftest import MANAGER_ID, Beethoven, message, run
+from webhook import SECRET_HEADER, WebhookServer
+
+
+def test_public_webhook_requires_secret(make_app, monkeypatch):
+    app = make_app()
+    monkeypatch.setenv("WEBHOOK_URL", "https://example.com/webhook")
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        Beethoven.run_webhook(app)
+    with pytest.raises(ValueError):
+        run(WebhookServer(app.dp, app.bot).set_webhook("https://example.com/webhook"))
+
+
+def test_forged_update_is_rejected(make_app):
+    app = make_app()
+    server = WebhookServer(app.dp, app.bot, secret_token="s3cret")
+
+    async def scenario():
+        async with TestClient(TestServer(server.build_app())) as client:
+            update = message(1, MANAGER_ID, "/export tickets")
+            forged = await client.post("/webhook", json=update)
+            wrong = await client.post("/webhook", json=update, headers={SECRET_HEADER: "guess"})
+            ok = await client.post("/webhook", json=message(2, 100, "/help"), headers={SECRET_HEADER: "s3cret"})
+            await asyncio.sleep(0.1)
+            return forged.status, wrong.status, ok.status
+
+    assert run(scenario()) == (401, 401, 200)
+    assert app.session.texts(MANAGER_ID) == []
+    assert app.session.texts(100)
@@ -0,0 +1,105 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём апдейтов через вебхук на aiohttp вместо long polling.
+
+    Апдейт проверяется по секретному токену, Telegram сразу получает 200,
+    а обработка идёт в фоне: одновременно не больше concurrency
+    обработчиков, и не больше max_pending апдейтов в работе — сверх этого
+    отвечаем 503, и Telegram повторит доставку позже. При остановке сервер
+    перестаёт принимать апдейты, дожидается начатых (не дольше
+    drain_timeout) и только потом вызывает shutdown-хуки диспетчера.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        path: str = "/webhook",
+        secret_token: Optional[str] = None,
+        concurrency: int = 64,
+        max_pending: int = 1000,
+        drain_timeout: float = 30.0,
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending = set()
+        self._accepting = False
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token is not None:
+            received = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(received, self.secret_token):
+                logger.warning(f"Вебхук: неверный секретный токен от {request.remote}")
+                return web.Response(status=401)
+        if not self._accepting or len(self._pending) >= self.max_pending:
+            return web.Response(status=503)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update: dict):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception as e:
+                logger.exception(f"Ошибка при обработке апдейта {update.get('update_id')}: {e}")
+
+    async def _on_startup(self, app: web.Application):
+        await self.dp.emit_startup(dispatcher=self.dp, bot=self.bot, bots=(self.bot,))
+        self._accepting = True
+
+    async def _on_shutdown(self, app: web.Application):
+        self._accepting = False
+        if self._pending:
+            logger.info(f"Вебхук: ожидаем завершения {len(self._pending)} обработчиков")
+            _, pending = await asyncio.wait(set(self._pending), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"Вебхук: прервано {len(pending)} обработчиков по таймауту")
+        try:
+            await self.dp.emit_shutdown(dispatcher=self.dp, bot=self.bot, bots=(self.bot,))
+        finally:
+            await self.bot.session.close()
+
+    async def set_webhook(self, url: str, max_connections: int = 40):
+        # Без секрета любой, кто достучится до адреса, подделает апдейт от менеджера
+        if not self.secret_token:
+            raise ValueError("Публичный вебхук регистрируется только с секретным токеном")
+        await self.bot.set_webhook(
+            url=url,
+            secret_token=self.secret_token,
+            max_connections=max_connections,
+            allowed_updates=self.dp.resolve_used_update_types(),
+        )